@@ -6,15 +6,144 @@ retrieval-augmented generation process, including question routing, document
 retrieval, answer generation, and various quality assessment functions.
 
 Each agent is implemented as a chain of components: a prompt template,
-a language model, and an output parser.
+a language model, and an output parser. All chains expose both a
+synchronous ``invoke`` and an asynchronous ``ainvoke`` so callers can
+overlap independent LLM calls instead of serializing Bedrock round-trips.
 """
 
-from langchain.prompts import PromptTemplate
+from collections import deque
+
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
+from langchain_core.prompt_values import StringPromptValue
+from langchain_core.runnables import Runnable
 from langchain_core.tools import tool
 from langchain_core.messages import HumanMessage, SystemMessage
 from opentelemetry import trace
-from utils.telemetry import get_session_context
+from utils.telemetry import set_span_session_context
+from utils.grader_cache import CachedGrader
+
+# System prompt for the RAG chain. Built once at import time and marked
+# with cache_control so Bedrock's prompt caching reuses the prefill K/V
+# computation for this static prefix across requests.
+_RAG_SYSTEM_PROMPT = """You are an AI research assistant for question-answering tasks.
+        Use the retrieved context to answer questions accurately and concisely.
+        If you have access to conversation history tools, use them to provide contextual responses
+        that reference previous questions or build upon earlier discussions.
+        If you don't know the answer, say so. Keep responses to three sentences maximum."""
+
+# Output parser shared by all grader chains; it is stateless, so one
+# instance serves every chain
+_JSON_PARSER = JsonOutputParser()
+
+# Window of recent requests tracked when deciding whether the memory
+# tool is still worth binding, and the hit ratio below which the tool
+# schema is dropped from the request prefill
+TOOL_HIT_WINDOW = 20
+TOOL_HIT_RATIO_MIN = 0.05
+
+# While the tool is dropped, every Nth request still goes to the
+# tool-bound LLM; the plain LLM can never emit tool calls, so without
+# these probes the binding could never come back
+TOOL_PROBE_INTERVAL = 20
+
+# Composed grader chains memoized per LLM identity so repeated create_*
+# calls on the hot path return the same runnable instead of rebuilding it
+_CHAIN_CACHE = {}
+
+
+def _memoized_chain(name, key, builder):
+    """Return a cached chain for (name, key), building it on first use."""
+    cache_key = (name,) + key
+    chain = _CHAIN_CACHE.get(cache_key)
+    if chain is None:
+        chain = builder()
+        _CHAIN_CACHE[cache_key] = chain
+    return chain
+
+
+_RAG_SYSTEM_MESSAGE = SystemMessage(content=[{
+    "type": "text",
+    "text": _RAG_SYSTEM_PROMPT,
+    "cache_control": {"type": "ephemeral"}
+}])
+
+class FastPrompt(Runnable):
+    """Minimal prompt formatter for constant templates.
+
+    For templates with plain {var} placeholders, str.format_map produces
+    the prompt string directly, skipping LangChain's template parsing on
+    every invocation while staying composable in a runnable chain.
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+    def invoke(self, input, config=None, **kwargs):
+        return StringPromptValue(text=self.template.format_map(input))
+
+
+# Grader prompt templates. These are static, so they are compiled once at
+# import time instead of being rebuilt on every create_* call.
+_RETRIEVAL_GRADER_PROMPT = FastPrompt(
+    template="""<|begin_of_text|><|start_header_id|>system<|end_header_id|> You are a grader assessing relevance
+    of a retrieved document to a user question. If the document contains keywords related to the user question,
+    grade it as relevant. It does not need to be a stringent test. The goal is to filter out erroneous retrievals. \n
+    Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question. \n
+    Provide the binary score as a JSON with a single key 'score' and no premable or explaination.
+     <|eot_id|><|start_header_id|>user<|end_header_id|>
+    Here is the retrieved document: \n\n {document} \n\n
+    Here is the user question: {question} \n <|eot_id|><|start_header_id|>assistant<|end_header_id|>""",
+)
+
+_BATCH_RETRIEVAL_GRADER_PROMPT = FastPrompt(
+    template="""<|begin_of_text|><|start_header_id|>system<|end_header_id|> You are a grader assessing relevance
+    of retrieved documents to a user question. If a document contains keywords related to the user question,
+    grade it as relevant. It does not need to be a stringent test. The goal is to filter out erroneous retrievals. \n
+    You are given a JSON array of documents, each with an 'id' and 'text'. Grade every document. \n
+    Return a JSON with a single key 'scores' containing an array of 'yes' or 'no' values in the same order
+    as the input array, and no preamble or explanation.
+     <|eot_id|><|start_header_id|>user<|end_header_id|>
+    Here are the retrieved documents: \n\n {documents_json} \n\n
+    Here is the user question: {question} \n <|eot_id|><|start_header_id|>assistant<|end_header_id|>""",
+)
+
+_HALLUCINATION_GRADER_PROMPT = FastPrompt(
+    template=""" <|begin_of_text|><|start_header_id|>system<|end_header_id|> You are a grader assessing whether
+    an answer is grounded in / supported by a set of facts. Give a binary 'yes' or 'no' score to indicate
+    whether the answer is grounded in / supported by a set of facts. Provide the binary score as a JSON with a
+    single key 'score' and no preamble or explanation. <|eot_id|><|start_header_id|>user<|end_header_id|>
+    Here are the facts:
+    \n ------- \n
+    {documents}
+    \n ------- \n
+    Here is the answer: {generation}  <|eot_id|><|start_header_id|>assistant<|end_header_id|>""",
+)
+
+_ANSWER_GRADER_PROMPT = FastPrompt(
+    template="""<|begin_of_text|><|start_header_id|>system<|end_header_id|> You are a grader assessing whether an
+    answer is useful to resolve a question. Give a binary score 'yes' or 'no' to indicate whether the answer is
+    useful to resolve a question. Provide the binary score as a JSON with a single key 'score' and no preamble or explanation.
+     <|eot_id|><|start_header_id|>user<|end_header_id|> Here is the answer:
+    \n ------- \n
+    {generation}
+    \n ------- \n
+    Here is the question: {question} <|eot_id|><|start_header_id|>assistant<|end_header_id|>""",
+)
+
+_COMBINED_GRADER_PROMPT = FastPrompt(
+    template="""<|begin_of_text|><|start_header_id|>system<|end_header_id|> You are a grader performing two
+    assessments of a generated answer. First, give a binary 'yes' or 'no' score to indicate whether the answer
+    is grounded in / supported by the provided facts. Second, give a binary 'yes' or 'no' score to indicate
+    whether the answer is useful to resolve the question. Provide both scores as a JSON with exactly two keys
+    'grounded' and 'useful' and no preamble or explanation. <|eot_id|><|start_header_id|>user<|end_header_id|>
+    Here are the facts:
+    \n ------- \n
+    {documents}
+    \n ------- \n
+    Here is the answer: {generation}
+    \n ------- \n
+    Here is the question: {question} <|eot_id|><|start_header_id|>assistant<|end_header_id|>""",
+)
 
 def create_rag_chain(llm, memory_client=None, memory_id=None, actor_id=None, session_id=None):
     """Create a retrieval-augmented generation (RAG) chain with memory support.
@@ -54,95 +183,199 @@ def create_rag_chain(llm, memory_client=None, memory_id=None, actor_id=None, ses
         llm_with_tools = llm.bind_tools([get_conversation_history])
     else:
         llm_with_tools = llm
-    
+
+    # Rolling record of whether recent responses actually used the tool,
+    # and how many plain-LLM requests have gone by since the last probe
+    recent_tool_hits = deque(maxlen=TOOL_HIT_WINDOW)
+    calls_since_probe = 0
+
+    def _select_llm():
+        """Pick the tool-bound LLM only while the tool is earning its keep.
+
+        Binding the history tool adds its JSON schema to every request's
+        prefill and invites speculative tool-call round-trips. Once a
+        full window of requests shows the model almost never calling it,
+        requests go to the plain LLM instead — except for an occasional
+        probe with the bound LLM, which is the only way a renewed need
+        for the tool can show up in the window and restore the binding.
+        """
+        nonlocal calls_since_probe
+        if llm_with_tools is llm or len(recent_tool_hits) < TOOL_HIT_WINDOW:
+            return llm_with_tools
+        hit_ratio = sum(recent_tool_hits) / len(recent_tool_hits)
+        if hit_ratio >= TOOL_HIT_RATIO_MIN:
+            return llm_with_tools
+        calls_since_probe += 1
+        if calls_since_probe >= TOOL_PROBE_INTERVAL:
+            calls_since_probe = 0
+            return llm_with_tools
+        return llm
+
+    def _record_tool_use(selected, used_tool):
+        """Note whether the response invoked the history tool.
+
+        Only responses from the tool-bound LLM count: the plain LLM
+        cannot emit tool calls, so sampling it would drag the hit ratio
+        down without measuring anything.
+        """
+        if llm_with_tools is not llm and selected is llm_with_tools:
+            recent_tool_hits.append(1 if used_tool else 0)
+
+    def _prepare_messages(inputs, span):
+        """Build the message list for the LLM and record span attributes."""
+        question = inputs.get("question", "")
+        context = inputs.get("context", "")
+        if span.is_recording():
+            span.set_attributes({
+                "question": question,
+                "context.length": len(str(context))
+            })
+            set_span_session_context(span)
+
+        # Static system prompt goes first as a cached block; only the
+        # question/context block changes between requests
+        return [
+            _RAG_SYSTEM_MESSAGE,
+            HumanMessage(content=f"Question: {question}\nContext: {context}")
+        ]
+
+    def _extract_response(result, span):
+        """Extract the text content from an LLM response object."""
+        import logging
+        logger = logging.getLogger(__name__)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("LLM result type=%s", type(result).__name__)
+
+        # ChatBedrock always returns an AIMessage, so a single attribute
+        # access is the common path; anything else stringifies
+        try:
+            response_content = result.content
+        except AttributeError:
+            response_content = result if isinstance(result, str) else str(result)
+
+        # Ensure we have a non-empty response
+        if not response_content or not response_content.strip():
+            logger.warning("Empty response from LLM, using fallback")
+            response_content = "I don't have enough information to answer this question."
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Final response content: '%s...'", response_content[:100])
+        if span.is_recording():
+            span.set_attribute("generation.length", len(response_content))
+        return response_content
+
     def traced_rag(inputs):
         with tracer.start_as_current_span("rag_generation") as span:
-            question = inputs.get("question", "")
-            context = inputs.get("context", "")
-            span.set_attribute("question", question)
-            span.set_attribute("context.length", len(str(context)))
-            
-            # Add session context to span
-            session_ctx = get_session_context()
-            for key, value in session_ctx.items():
-                if value:
-                    span.set_attribute(f"session.{key}", value)
-            
-            # Enhanced system message for memory-aware responses
-            system_message = """You are an AI research assistant for question-answering tasks.
-            Use the retrieved context to answer questions accurately and concisely.
-            If you have access to conversation history tools, use them to provide contextual responses
-            that reference previous questions or build upon earlier discussions.
-            If you don't know the answer, say so. Keep responses to three sentences maximum."""
-            
-            # Create messages for the LLM
-            messages = [
-                SystemMessage(content=system_message),
-                HumanMessage(content=f"Question: {question}\nContext: {context}")
-            ]
-            
-            result = llm_with_tools.invoke(messages)
-            
-            # Debug logging
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.info(f"LLM result type: {type(result)}")
-            logger.info(f"LLM result attributes: {dir(result)}")
-            if hasattr(result, 'content'):
-                logger.info(f"LLM result.content: '{result.content}'")
-            
-            # Extract content from the response
-            if hasattr(result, 'content'):
-                response_content = result.content
-            elif hasattr(result, 'text'):
-                response_content = result.text
-            elif isinstance(result, str):
-                response_content = result
-            else:
-                response_content = str(result)
-            
-            # Ensure we have a non-empty response
-            if not response_content or not response_content.strip():
-                logger.warning("Empty response from LLM, using fallback")
-                response_content = "I don't have enough information to answer this question."
-            
-            logger.info(f"Final response content: '{response_content[:100]}...'")
-            span.set_attribute("generation.length", len(response_content))
-            return response_content
-    
+            messages = _prepare_messages(inputs, span)
+            selected = _select_llm()
+            result = selected.invoke(messages)
+            _record_tool_use(selected, getattr(result, "tool_calls", None))
+            return _extract_response(result, span)
+
+    async def atraced_rag(inputs):
+        with tracer.start_as_current_span("rag_generation") as span:
+            messages = _prepare_messages(inputs, span)
+            selected = _select_llm()
+            result = await selected.ainvoke(messages)
+            _record_tool_use(selected, getattr(result, "tool_calls", None))
+            return _extract_response(result, span)
+
+    def streamed_rag(inputs):
+        with tracer.start_as_current_span("rag_generation") as span:
+            messages = _prepare_messages(inputs, span)
+            selected = _select_llm()
+            total_length = 0
+            used_tool = False
+            for chunk in selected.stream(messages):
+                # Tool calls arrive as partial tool_call_chunks while
+                # streaming; any one of them marks the response a hit
+                if not used_tool and (getattr(chunk, "tool_call_chunks", None)
+                                      or getattr(chunk, "tool_calls", None)):
+                    used_tool = True
+                content = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                if content:
+                    total_length += len(content)
+                    yield content
+            _record_tool_use(selected, used_tool)
+            if span.is_recording():
+                span.set_attribute("generation.length", total_length)
+
     class TracedChain:
         def invoke(self, inputs):
             return traced_rag(inputs)
-    
+
+        async def ainvoke(self, inputs):
+            return await atraced_rag(inputs)
+
+        def stream(self, inputs):
+            return streamed_rag(inputs)
+
     return TracedChain()
 
 
-def create_retrieval_grader(llm):
+def create_retrieval_grader(llm, embed_model=None):
     """Create a document relevance grading agent.
-    
+
     This agent assesses whether a retrieved document is relevant to the
     user's question. It uses a lenient approach to avoid filtering out
     potentially useful documents.
-    
+
+    Grader decisions are cached by (question, document) content, and when
+    an embeddings model is provided, clearly relevant pairs are scored by
+    embedding similarity without an LLM call at all.
+
     Args:
         llm: The language model to use for relevance assessment
-        
+        embed_model: Optional embeddings model for the similarity shortcut
+
     Returns:
         A chain that evaluates document relevance and returns a JSON with
         a 'score' key containing either 'yes' or 'no'
     """
-    prompt = PromptTemplate(
-        template="""<|begin_of_text|><|start_header_id|>system<|end_header_id|> You are a grader assessing relevance 
-        of a retrieved document to a user question. If the document contains keywords related to the user question, 
-        grade it as relevant. It does not need to be a stringent test. The goal is to filter out erroneous retrievals. \n
-        Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question. \n
-        Provide the binary score as a JSON with a single key 'score' and no premable or explaination.
-         <|eot_id|><|start_header_id|>user<|end_header_id|>
-        Here is the retrieved document: \n\n {document} \n\n
-        Here is the user question: {question} \n <|eot_id|><|start_header_id|>assistant<|end_header_id|>""",
-        input_variables=["question", "document"],
-    )
-    return prompt | llm | JsonOutputParser()
+    return _memoized_chain(
+        "retrieval_grader", (id(llm), id(embed_model)),
+        lambda: CachedGrader(_RETRIEVAL_GRADER_PROMPT | llm | _JSON_PARSER,
+                             embed_model=embed_model))
+
+
+def create_batch_retrieval_grader(llm):
+    """Create a batched document relevance grading agent.
+
+    This agent grades all retrieved documents for a question in a single
+    LLM call instead of one call per document, cutting Bedrock round
+    trips by the number of documents retrieved.
+
+    Args:
+        llm: The language model to use for relevance assessment
+
+    Returns:
+        A chain that takes a question and a JSON array of documents and
+        returns a JSON with a 'scores' key containing a list of 'yes' or
+        'no' values in input order
+    """
+    return _memoized_chain(
+        "batch_retrieval_grader", (id(llm),),
+        lambda: _BATCH_RETRIEVAL_GRADER_PROMPT | llm | _JSON_PARSER)
+
+
+def create_combined_grader(llm):
+    """Create a fused hallucination and usefulness grading agent.
+
+    This agent performs both post-generation assessments - factual
+    grounding and answer usefulness - in a single LLM call, halving the
+    Bedrock round trips spent grading each generation compared to
+    invoking the hallucination and answer graders separately.
+
+    Args:
+        llm: The language model to use for the assessments
+
+    Returns:
+        A chain that evaluates a generation and returns a JSON with
+        'grounded' and 'useful' keys, each containing 'yes' or 'no'
+    """
+    return _memoized_chain(
+        "combined_grader", (id(llm),),
+        lambda: _COMBINED_GRADER_PROMPT | llm | _JSON_PARSER)
 
 
 def create_hallucination_grader(llm):
@@ -159,19 +392,9 @@ def create_hallucination_grader(llm):
         A chain that evaluates factual grounding and returns a JSON with
         a 'score' key containing either 'yes' or 'no'
     """
-    prompt = PromptTemplate(
-        template=""" <|begin_of_text|><|start_header_id|>system<|end_header_id|> You are a grader assessing whether 
-        an answer is grounded in / supported by a set of facts. Give a binary 'yes' or 'no' score to indicate 
-        whether the answer is grounded in / supported by a set of facts. Provide the binary score as a JSON with a 
-        single key 'score' and no preamble or explanation. <|eot_id|><|start_header_id|>user<|end_header_id|>
-        Here are the facts:
-        \n ------- \n
-        {documents} 
-        \n ------- \n
-        Here is the answer: {generation}  <|eot_id|><|start_header_id|>assistant<|end_header_id|>""",
-        input_variables=["generation", "documents"],
-    )
-    return prompt | llm | JsonOutputParser()
+    return _memoized_chain(
+        "hallucination_grader", (id(llm),),
+        lambda: _HALLUCINATION_GRADER_PROMPT | llm | _JSON_PARSER)
 
 
 def create_answer_grader(llm):
@@ -188,15 +411,6 @@ def create_answer_grader(llm):
         A chain that evaluates answer usefulness and returns a JSON with
         a 'score' key containing either 'yes' or 'no'
     """
-    prompt = PromptTemplate(
-        template="""<|begin_of_text|><|start_header_id|>system<|end_header_id|> You are a grader assessing whether an 
-        answer is useful to resolve a question. Give a binary score 'yes' or 'no' to indicate whether the answer is 
-        useful to resolve a question. Provide the binary score as a JSON with a single key 'score' and no preamble or explanation.
-         <|eot_id|><|start_header_id|>user<|end_header_id|> Here is the answer:
-        \n ------- \n
-        {generation} 
-        \n ------- \n
-        Here is the question: {question} <|eot_id|><|start_header_id|>assistant<|end_header_id|>""",
-        input_variables=["generation", "question"],
-    )
-    return prompt | llm | JsonOutputParser()
\ No newline at end of file
+    return _memoized_chain(
+        "answer_grader", (id(llm),),
+        lambda: _ANSWER_GRADER_PROMPT | llm | _JSON_PARSER)
\ No newline at end of file
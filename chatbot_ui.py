@@ -1,30 +1,27 @@
 import streamlit as st
 from main import initialize_system
-import time
 import logging
 import os
 import json
+import hashlib
 from document_processor import process_file, add_documents_to_vectorstore
 from config import initialize_bedrock_client, initialize_embeddings
 from handlers.auth_handler import AuthHandler
 from components.login_page import login_page
-from utils.telemetry import set_session_context
+from utils.logging_setup import configure_logging
+from utils.telemetry import configure_tracing, set_session_context
 
 # os.environ["OTEL_EXPORTER_OTLP_ENDPOINT"] = f"https://aps-workspaces.us-east-1.amazonaws.com/v1/metrics"
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("chatbot_ui.log"),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging; records are written to disk off the request thread
+configure_logging("chatbot_ui.log")
 logger = logging.getLogger(__name__)
 
 os.environ["LANGSMITH_OTEL_ENABLED"] = "true"
 
+# Head-sample traces so most requests skip the tracing SDK path entirely
+configure_tracing()
+
 def load_aws_credentials():
     """Load AWS credentials from config file."""
     try:
@@ -35,6 +32,16 @@ def load_aws_credentials():
         st.error(f"Error loading AWS credentials: {str(e)}")
         return {}
 
+@st.cache_resource
+def _shared_embed_model():
+    """Build the embeddings model once per process and share it.
+
+    Every login previously constructed its own Bedrock client and
+    embeddings wrapper; with cache_resource all sessions get the same
+    instance via a hash-table lookup.
+    """
+    return initialize_embeddings(initialize_bedrock_client())
+
 def init_session_state():
     """Initialize session state variables."""
     if "messages" not in st.session_state:
@@ -42,9 +49,8 @@ def init_session_state():
     if "uploaded_files" not in st.session_state:
         st.session_state.uploaded_files = []
     if "embed_model" not in st.session_state:
-        # Initialize embedding model for document processing
-        bedrock_client = initialize_bedrock_client()
-        st.session_state.embed_model = initialize_embeddings(bedrock_client)
+        # Embedding model for document processing, shared across sessions
+        st.session_state.embed_model = _shared_embed_model()
     
     # Initialize workflow manager only after authentication
     if ("workflow_manager" not in st.session_state and 
@@ -72,28 +78,38 @@ def load_memory_history():
     workflow_manager = st.session_state.workflow_manager
     logger.info(f"Loading memory history. Memory client: {hasattr(workflow_manager, 'memory_client')}, Memory ID: {hasattr(workflow_manager, 'memory_id')}")
     
-    if (hasattr(workflow_manager, 'memory_client') and workflow_manager.memory_client and 
-        hasattr(workflow_manager, 'memory_id') and workflow_manager.memory_id and 
+    if (hasattr(workflow_manager, 'memory_client') and workflow_manager.memory_client and
+        hasattr(workflow_manager, 'memory_id') and workflow_manager.memory_id and
         not st.session_state.messages):  # Only load if no messages exist
         try:
-            events = workflow_manager.memory_client.list_events(
-                memory_id=workflow_manager.memory_id,
-                actor_id=workflow_manager.actor_id,
-                session_id=workflow_manager.session_id,
-                max_results=20
-            )
-            
-            # Convert memory events to chat messages
-            for event in reversed(events):  # Reverse to get chronological order
-                if 'messages' in event:
-                    for message_pair in event['messages']:
-                        if len(message_pair) >= 2:
-                            content, role = message_pair[0], message_pair[1]
-                            if role == "USER":
-                                st.session_state.messages.append({"role": "user", "content": content})
-                            elif role == "ASSISTANT":
-                                st.session_state.messages.append({"role": "assistant", "content": content, "source": "Memory"})
-            
+            # Cache the fetched events per memory/session so reruns don't
+            # re-hit the memory service
+            cache_key = (workflow_manager.memory_id, workflow_manager.session_id)
+            if st.session_state.get("memory_events_key") == cache_key:
+                events = st.session_state.memory_events
+            else:
+                events = workflow_manager.memory_client.list_events(
+                    memory_id=workflow_manager.memory_id,
+                    actor_id=workflow_manager.actor_id,
+                    session_id=workflow_manager.session_id,
+                    max_results=20
+                )
+                st.session_state.memory_events_key = cache_key
+                st.session_state.memory_events = events
+
+            # Convert memory events to chat messages in one pass (reversed
+            # for chronological order) and assign the list atomically so
+            # session state is written once instead of per message
+            st.session_state.messages = [
+                {"role": "user", "content": content} if role == "USER"
+                else {"role": "assistant", "content": content, "source": "Memory"}
+                for event in reversed(events)
+                for message_pair in event.get('messages', ())
+                if len(message_pair) >= 2
+                for content, role in (message_pair[:2],)
+                if role in ("USER", "ASSISTANT")
+            ]
+
             if events:
                 logger.info(f"Loaded {len(events)} conversation events from memory")
         except Exception as e:
@@ -123,17 +139,19 @@ def process_uploaded_file(file):
     try:
         # Process the file
         doc_splits = process_file(file)
-        
+
+        # The embedding cache is keyed by the file's content hash, so
+        # re-uploading a file skips the Bedrock embedding calls
+        file_hash = hashlib.sha256(file.getvalue()).hexdigest()
+
         # Get workflow manager from session state
         workflow_manager = st.session_state.workflow_manager
-        
-        # Debug information
-        logger.info(f"WorkflowManager attributes: {dir(workflow_manager)}")
-        
+
         # Check if vectorstore exists in workflow manager
         if hasattr(workflow_manager, 'vectorstore') and workflow_manager.vectorstore is not None:
             logger.info("Found vectorstore in workflow manager")
-            add_documents_to_vectorstore(workflow_manager.vectorstore, doc_splits)
+            add_documents_to_vectorstore(workflow_manager.vectorstore, doc_splits,
+                                         cache_key=file_hash)
             st.session_state.uploaded_files.append(file.name)
             return True
         else:
@@ -157,10 +175,29 @@ def process_uploaded_file(file):
             st.session_state.uploaded_files.append(file.name)
             return True
     except Exception as e:
-        logger.error(f"Error processing file {file.name}: {str(e)}")
-        logger.error(f"Exception details: {str(e)}", exc_info=True)
+        logger.error("Error processing file %s: %s", file.name, str(e), exc_info=True)
         return False
 
+def extract_chunk_text(chunk) -> str:
+    """Extract display text from a streamed LLM message chunk.
+
+    Args:
+        chunk: Message chunk emitted by the workflow's token stream
+
+    Returns:
+        The chunk's text content, or an empty string if it has none
+    """
+    content = getattr(chunk, "content", "")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        # Anthropic models emit a list of content blocks
+        return "".join(
+            block.get("text", "") for block in content
+            if isinstance(block, dict) and block.get("type") == "text"
+        )
+    return ""
+
 def process_user_input(user_input: str):
     """Process user input and generate response.
     
@@ -195,20 +232,37 @@ def process_user_input(user_input: str):
         try:
             # Show "Thinking..." while processing
             message_placeholder.markdown("Thinking...")
-            
+
             # Run the workflow
             final_output = None
-            
+            value = None
+
             # Track processing steps and data source
             processing_steps = []
             last_node = None
-            
-            for output in workflow_manager.create_workflow().stream(inputs):
-                for key, value in output.items():
+
+            # Stream both node updates (for source tracking) and LLM tokens
+            # so the answer renders as it is generated instead of after the
+            # whole workflow finishes.
+            for mode, payload in workflow_manager.create_workflow().stream(
+                    inputs, stream_mode=["updates", "messages"]):
+                if mode == "messages":
+                    chunk, metadata = payload
+                    # Only surface tokens from the answer-generation node,
+                    # not from the grader calls
+                    if metadata.get("langgraph_node") == "generate":
+                        token = extract_chunk_text(chunk)
+                        if token:
+                            full_response += token
+                            message_placeholder.markdown(full_response + "▌")
+                    continue
+
+                for key, value in payload.items():
                     last_node = key
                     processing_steps.append(f"Processing: {key}")
-                    message_placeholder.markdown(f"Thinking...\n\n*{', '.join(processing_steps)}*")
-                    
+                    if not full_response:
+                        message_placeholder.markdown(f"Thinking...\n\n*{', '.join(processing_steps)}*")
+
                     # Track data source based on the workflow path
                     if key == "websearch":
                         data_source = "Web Search"
@@ -218,10 +272,10 @@ def process_user_input(user_input: str):
                     elif key == "retrieve" or key == "grade_documents":
                         if data_source != "Web Search":  # Don't override web search
                             data_source = "Knowledge Base"
-                    
+
                     if isinstance(value, dict) and "generation" in value:
                         final_output = value["generation"]
-            
+
             # Update source information based on the last processing step
             if final_output and isinstance(value, dict) and "documents" in value:
                 docs = value["documents"]
@@ -239,14 +293,13 @@ def process_user_input(user_input: str):
             source_placeholder.caption(f"Source: {data_source}")
             
             if final_output:
-                # Simulate typing effect
-                for chunk in final_output.split():
-                    full_response += chunk + " "
-                    time.sleep(0.02)  # Slightly faster typing speed
-                    message_placeholder.markdown(full_response)
-            else:
+                # The final state is authoritative (it includes any fallback
+                # text substituted by the workflow); tokens already streamed
+                # above just made it appear incrementally.
+                full_response = final_output
+            elif not full_response:
                 full_response = "I apologize, but I couldn't generate a response for that question."
-                message_placeholder.markdown(full_response)
+            message_placeholder.markdown(full_response)
                 
         except Exception as e:
             logger.error(f"Error processing input: {str(e)}")
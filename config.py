@@ -1,4 +1,6 @@
 import os
+from functools import lru_cache
+
 import boto3
 from botocore.config import Config
 from dotenv import load_dotenv
@@ -6,9 +8,20 @@ from langchain_aws import BedrockEmbeddings, ChatBedrock
 
 load_dotenv()
 
+@lru_cache(maxsize=1)
 def initialize_bedrock_client():
-    """Initialize AWS Bedrock client."""
-    config = Config(retries={'max_attempts': 3, 'mode': 'adaptive'})
+    """Initialize AWS Bedrock client.
+
+    The client is created once per process and shared across sessions:
+    credential resolution and endpoint discovery happen only on the first
+    call, and keep-alive pooled connections let later Bedrock calls skip
+    new TCP handshakes.
+    """
+    config = Config(
+        retries={'max_attempts': 3, 'mode': 'adaptive'},
+        tcp_keepalive=True,
+        max_pool_connections=50
+    )
     return boto3.client(
         service_name="bedrock-runtime",
         region_name=os.getenv("AWS_REGION", ""),
@@ -17,8 +30,9 @@ def initialize_bedrock_client():
         config=config
     )
 
+@lru_cache(maxsize=2)
 def initialize_embeddings(client):
-    """Initialize Bedrock embeddings model."""
+    """Initialize Bedrock embeddings model, one instance per client."""
     return BedrockEmbeddings(client=client, model_id="amazon.titan-embed-text-v1")
 
 def initialize_llm(client):
@@ -26,8 +40,10 @@ def initialize_llm(client):
     return ChatBedrock(
         client=client,
         model_id="anthropic.claude-3-haiku-20240307-v1:0",
+        streaming=True,
         model_kwargs={
             "anthropic_version": "bedrock-2023-05-31",
+            "anthropic_beta": ["prompt-caching-2024-07-31"],
             "max_tokens": 2000,
             "temperature": 0.7
         }
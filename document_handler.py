@@ -1,35 +1,27 @@
 import os
 from typing import List
-import PyPDF2
-from docx import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document as LangchainDocument
+from document_processor import get_text_splitter, merge_small_chunks
 
 # os.environ["OTEL_EXPORTER_OTLP_ENDPOINT"] = f"https://aps-workspaces.us-east-1.amazonaws.com/v1/metrics"
 
 class DocumentHandler:
     def __init__(self, persist_directory: str = "./chroma_db"):
         self.persist_directory = persist_directory
-        self.text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            chunk_size=512, 
-            chunk_overlap=0
-        )
+        # Shared memoized splitter so the tokenizer loads once per process
+        self.text_splitter = get_text_splitter(chunk_size=512, chunk_overlap=0)
 
     def read_pdf(self, file) -> str:
         """Read PDF file and return text content."""
+        import PyPDF2
         pdf_reader = PyPDF2.PdfReader(file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        return text
+        return "".join(page.extract_text() for page in pdf_reader.pages)
 
     def read_docx(self, file) -> str:
         """Read DOCX file and return text content."""
+        from docx import Document
         doc = Document(file)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
+        return "\n".join(paragraph.text for paragraph in doc.paragraphs) + "\n"
 
     def read_txt(self, file) -> str:
         """Read TXT file and return text content."""
@@ -55,5 +47,5 @@ class DocumentHandler:
             metadata={"source": file_name}
         )
 
-        # Split the document
-        return self.text_splitter.split_documents([doc])
+        # Split the document and fold tiny tail chunks into their predecessor
+        return merge_small_chunks(self.text_splitter.split_documents([doc]))
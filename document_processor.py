@@ -1,18 +1,150 @@
+import atexit
+import codecs
+import hashlib
+import io
+import mmap
 import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from typing import List, Optional
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.vectorstores import Chroma
 from langchain.schema import Document as LangchainDocument
-import PyPDF2
-from docx import Document
+import numpy as np
 import logging
+from utils.fast_text import dedupe_whitespace
+
+# Heavy parsers (tiktoken, PyPDF2, pypdfium2, python-docx, Chroma) are
+# imported lazily at first use to keep worker cold-start fast and let
+# forked processes share only what they actually touch
 
 # os.environ["OTEL_EXPORTER_OTLP_ENDPOINT"] = f"https://aps-workspaces.us-east-1.amazonaws.com/v1/metrics"
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# On-disk cache of chunk embeddings keyed by uploaded-file content hash
+EMBED_CACHE_DIR = "./.embed_cache"
+
+# Bedrock Titan accepts at most this many texts per embedding request
+EMBED_BATCH_SIZE = 25
+
+# Number of embedding batches kept in flight concurrently
+EMBED_CONCURRENCY = 8
+
+# Batch size and thread count for the add_documents fallback path,
+# where the store embeds chunks itself
+ADD_BATCH_SIZE = 64
+ADD_CONCURRENCY = 4
+
+# Token counts memoized per exact substring; the splitter re-measures the
+# same substrings across recursion levels, so hit rates are high
+_TOKEN_COUNT_CACHE_LIMIT = 100_000
+_token_count_cache = {}
+
+@lru_cache(maxsize=1)
+def _get_encoder():
+    """Load the tiktoken BPE encoder once per process."""
+    import tiktoken
+    return tiktoken.get_encoding("cl100k_base")
+
+def _cached_token_len(text: str) -> int:
+    """Count tokens in text, memoizing by content hash."""
+    key = hash(text)
+    count = _token_count_cache.get(key)
+    if count is None:
+        if len(_token_count_cache) >= _TOKEN_COUNT_CACHE_LIMIT:
+            _token_count_cache.clear()
+        count = len(_get_encoder().encode(text, disallowed_special=()))
+        _token_count_cache[key] = count
+    return count
+
+@lru_cache(maxsize=4)
+def get_text_splitter(chunk_size=512, chunk_overlap=50):
+    """Return a shared token-aware text splitter.
+
+    The splitter (and the tokenizer behind it) is built once per
+    (chunk_size, chunk_overlap) pair instead of per processed file, and
+    its length function memoizes token counts per substring.
+    """
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=_cached_token_len
+    )
+
+# Roughly 4 characters per token for English prose; used to size the
+# fast character-based splitter so its chunks land near the token limit
+_CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=4)
+def _get_char_splitter(chunk_size=512, chunk_overlap=50):
+    """Return a shared character-count splitter sized in token-equivalents."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size * _CHARS_PER_TOKEN,
+        chunk_overlap=chunk_overlap * _CHARS_PER_TOKEN
+    )
+
+def split_documents_fast(docs, chunk_size=512, chunk_overlap=50):
+    """Split documents on character counts, token-verifying only oversize chunks.
+
+    The recursive splitter measures every candidate split with its length
+    function, so token counting dominates chunking runtime. Splitting on
+    character counts first (at ~4 chars per token) and then re-splitting
+    only the chunks whose real token count exceeds chunk_size removes
+    most tiktoken calls while keeping the same token-size guarantee.
+
+    Args:
+        docs: Documents to split
+        chunk_size: Maximum chunk size in tokens
+        chunk_overlap: Chunk overlap in tokens
+
+    Returns:
+        List of document chunks, each at most chunk_size tokens
+    """
+    chunks = _get_char_splitter(chunk_size, chunk_overlap).split_documents(docs)
+
+    token_splitter = None
+    verified = []
+    for chunk in chunks:
+        if _cached_token_len(chunk.page_content) <= chunk_size:
+            verified.append(chunk)
+        else:
+            if token_splitter is None:
+                token_splitter = get_text_splitter(chunk_size, chunk_overlap)
+            verified.extend(token_splitter.split_documents([chunk]))
+    return merge_small_chunks(verified, chunk_size=chunk_size)
+
+# Chunks below this many tokens are folded into their predecessor;
+# every chunk costs an embedding call and a vector row, so tiny tail
+# chunks are pure overhead
+MIN_CHUNK_TOKENS = 100
+
+def merge_small_chunks(chunks, chunk_size=512, min_tokens=MIN_CHUNK_TOKENS):
+    """Fold sub-min_tokens chunks into the preceding chunk.
+
+    Only merges when the combined chunk stays within chunk_size tokens,
+    so the splitter's size guarantee is preserved.
+
+    Args:
+        chunks: Document chunks from a splitter
+        chunk_size: Maximum merged chunk size in tokens
+        min_tokens: Chunks below this token count are merge candidates
+
+    Returns:
+        List of chunks with tiny tails merged away
+    """
+    merged = []
+    for chunk in chunks:
+        if (merged and _cached_token_len(chunk.page_content) < min_tokens
+                and _cached_token_len(merged[-1].page_content)
+                + _cached_token_len(chunk.page_content) <= chunk_size):
+            merged[-1].page_content += " " + chunk.page_content
+        else:
+            merged.append(chunk)
+    return merged
+
 def process_file(file) -> List[LangchainDocument]:
     """Process uploaded file and return list of documents.
     
@@ -27,81 +159,451 @@ def process_file(file) -> List[LangchainDocument]:
     
     logger.info(f"Processing file: {file_name} with extension {file_extension}")
     
-    # Read file content based on file type
+    # Read file content based on file type; PDFs are handled one
+    # document per page so memory stays at page granularity
     if file_extension == '.pdf':
-        text = read_pdf(file)
+        docs = list(iter_pdf_pages(file, file_name))
     elif file_extension == '.docx':
-        text = read_docx(file)
+        docs = [LangchainDocument(
+            page_content=read_docx(file),
+            metadata={"source": file_name}
+        )]
     elif file_extension == '.txt':
-        text = read_txt(file)
+        docs = [LangchainDocument(
+            page_content=read_txt(file),
+            metadata={"source": file_name}
+        )]
     else:
         raise ValueError(f"Unsupported file type: {file_extension}")
-    
-    # Create a Langchain Document
-    doc = LangchainDocument(
-        page_content=text,
-        metadata={"source": file_name}
-    )
-    
-    # Split the document
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=512, 
-        chunk_overlap=50
-    )
-    doc_splits = text_splitter.split_documents([doc])
+
+    # Split the documents
+    doc_splits = split_documents_fast(docs, chunk_size=512, chunk_overlap=50)
     logger.info(f"Split document into {len(doc_splits)} chunks")
     
     return doc_splits
 
+# Chroma persist rewrites SQLite segments under fsync, so it is only
+# run once this many chunks have been added since the last persist, or
+# once pending adds have waited this many seconds
+PERSIST_THRESHOLD = 1000
+PERSIST_MAX_INTERVAL = 5.0
+_pending_adds = 0
+_pending_store = None
+_last_persist = time.monotonic()
+
+def _persist_if_due(vectorstore, added):
+    """Persist the store once enough chunks or enough time has accumulated.
+
+    Args:
+        vectorstore: Chroma vector store that just received adds
+        added: Number of chunks added in this call
+    """
+    global _pending_adds, _pending_store, _last_persist
+    _pending_adds += added
+    _pending_store = vectorstore
+    if (_pending_adds >= PERSIST_THRESHOLD
+            or time.monotonic() - _last_persist > PERSIST_MAX_INTERVAL):
+        vectorstore.persist()
+        _pending_adds = 0
+        _pending_store = None
+        _last_persist = time.monotonic()
+        logger.info("Vector store persisted at debounce threshold")
+
+def flush_vectorstore(vectorstore=None):
+    """Persist any adds still pending below the batch threshold.
+
+    Call at an explicit checkpoint (e.g. session end) to make sure the
+    last partial batch reaches disk; also registered atexit as a
+    backstop for process shutdown.
+
+    Args:
+        vectorstore: Store to persist; defaults to the last one written
+    """
+    global _pending_adds, _pending_store, _last_persist
+    store = vectorstore if vectorstore is not None else _pending_store
+    if _pending_adds and store is not None:
+        try:
+            store.persist()
+            logger.info("Vector store flushed to disk")
+        except Exception as e:
+            logger.warning(f"Failed to flush vector store: {str(e)}")
+    _pending_adds = 0
+    _pending_store = None
+    _last_persist = time.monotonic()
+
+atexit.register(flush_vectorstore)
+
+# Upper bound on threads used for per-page PDF text extraction
+PDF_EXTRACT_WORKERS = 8
+
+def _extract_page_texts_pypdf(pdf_reader) -> List[str]:
+    """Extract the text of every page, in parallel for multi-page PDFs.
+
+    Pages are independent and extract_text spends much of its time in
+    zlib decompression, which releases the GIL.
+    """
+    pages = list(pdf_reader.pages)
+    if len(pages) <= 1:
+        return [dedupe_whitespace(page.extract_text() or "") for page in pages]
+
+    with ThreadPoolExecutor(max_workers=min(PDF_EXTRACT_WORKERS, len(pages))) as executor:
+        return list(executor.map(
+            lambda page: dedupe_whitespace(page.extract_text() or ""), pages))
+
+def _extract_page_texts(file) -> List[str]:
+    """Extract per-page text from a PDF file object.
+
+    Uses PDFium when pypdfium2 is installed (the C++ extractor is
+    several times faster than PyPDF2 even single-threaded; PDFium is
+    not thread-safe, so its pages are processed sequentially) and the
+    threaded PyPDF2 path otherwise.
+    """
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        pdfium = None
+
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(file.read() if hasattr(file, 'read') else file)
+        try:
+            return [dedupe_whitespace(page.get_textpage().get_text_range() or "")
+                    for page in pdf]
+        finally:
+            pdf.close()
+
+    import PyPDF2
+    return _extract_page_texts_pypdf(PyPDF2.PdfReader(file))
+
 def read_pdf(file) -> str:
     """Read PDF file and return text content."""
-    pdf_reader = PyPDF2.PdfReader(file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    return text
+    return "\n".join(_extract_page_texts(file)) + "\n"
+
+def iter_pdf_pages(file, source_name):
+    """Yield one document per PDF page.
+
+    Working page-by-page keeps peak memory at page granularity instead
+    of materializing the whole PDF as one string, and gives the splitter
+    smaller inputs so it never token-counts across page boundaries.
+
+    Args:
+        file: PDF file object
+        source_name: Source file name recorded in page metadata
+
+    Yields:
+        One LangchainDocument per page with page-number metadata
+    """
+    for page_number, text in enumerate(_extract_page_texts(file), start=1):
+        if text.strip():
+            yield LangchainDocument(
+                page_content=text,
+                metadata={"source": source_name, "page": page_number}
+            )
+
+# Below this many paragraphs, fork overhead outweighs parallel gains
+DOCX_PARALLEL_THRESHOLD = 500
+
+def _docx_paragraph_texts(file_bytes, start, end):
+    """Extract the text of a paragraph range from raw docx bytes.
+
+    Top-level so it can be dispatched to worker processes; each worker
+    re-opens the document (lxml parsing is cheap C code) and pays only
+    its share of the pure-Python paragraph.text walks.
+    """
+    from docx import Document
+    doc = Document(io.BytesIO(file_bytes))
+    return [paragraph.text for paragraph in doc.paragraphs[start:end]]
 
 def read_docx(file) -> str:
-    """Read DOCX file and return text content."""
-    doc = Document(file)
-    text = ""
-    for paragraph in doc.paragraphs:
-        text += paragraph.text + "\n"
-    return text
+    """Read DOCX file and return text content.
+
+    paragraph.text walks XML in pure Python and is GIL-bound, so large
+    documents shard their paragraph ranges across a process pool.
+    """
+    from docx import Document
+    file_bytes = file.read() if hasattr(file, 'read') else file
+    doc = Document(io.BytesIO(file_bytes))
+    total = len(doc.paragraphs)
+    if total < DOCX_PARALLEL_THRESHOLD:
+        return "\n".join(paragraph.text for paragraph in doc.paragraphs) + "\n"
+
+    workers = min(os.cpu_count() or 1, (total + DOCX_PARALLEL_THRESHOLD - 1)
+                  // DOCX_PARALLEL_THRESHOLD)
+    span = (total + workers - 1) // workers
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shards = executor.map(
+                _docx_paragraph_texts,
+                [file_bytes] * workers,
+                range(0, total, span),
+                [min(start + span, total) for start in range(0, total, span)]
+            )
+            texts = [text for shard in shards for text in shard]
+    except Exception as e:
+        logger.warning(f"Parallel docx extraction failed, reading serially: {str(e)}")
+        texts = [paragraph.text for paragraph in doc.paragraphs]
+    return "\n".join(texts) + "\n"
+
+# Decode window for mmap-backed TXT reads (1 MiB)
+_TXT_READ_CHUNK = 1 << 20
 
 def read_txt(file) -> str:
-    """Read TXT file and return text content."""
-    return file.read().decode('utf-8')
+    """Read TXT file and return text content.
+
+    Disk-backed files are mapped with mmap and decoded incrementally in
+    1 MiB windows, which avoids holding both the raw bytes and the
+    decoded string in memory at once. In-memory uploads (Streamlit's
+    BytesIO) fall back to a plain read.
+    """
+    try:
+        fileno = file.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return file.read().decode('utf-8')
+
+    # mmap refuses zero-length mappings, so empty files short-circuit
+    if os.fstat(fileno).st_size == 0:
+        return ""
+
+    mm = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    try:
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        with memoryview(mm) as view:
+            parts = [decoder.decode(view[start:start + _TXT_READ_CHUNK])
+                     for start in range(0, len(mm), _TXT_READ_CHUNK)]
+        parts.append(decoder.decode(b'', final=True))
+        return "".join(parts)
+    finally:
+        mm.close()
+
+def _embed_in_batches(embed_model, texts):
+    """Embed texts in concurrent batches, preserving input order.
+
+    Byte-identical texts (repeated headers, footers, boilerplate) are
+    embedded once and their vector fanned out to every occurrence, so
+    duplicate chunks cost nothing on the wire.
+
+    The embedding step is I/O-bound, so running batches in parallel
+    gives near-linear speedup for large uploads. Longer batches are
+    dispatched first to avoid a straggler tail.
+
+    Args:
+        embed_model: Embeddings model (synchronous Bedrock client)
+        texts: Texts to embed
+
+    Returns:
+        List of embedding vectors in the same order as texts
+    """
+    # Content-addressed dedup before any network calls
+    by_hash = {}
+    unique_texts = []
+    hashes = []
+    for text in texts:
+        text_hash = hashlib.sha256(text.encode("utf-8")).digest()
+        hashes.append(text_hash)
+        if text_hash not in by_hash:
+            by_hash[text_hash] = len(unique_texts)
+            unique_texts.append(text)
+    if len(unique_texts) < len(texts):
+        logger.info(f"Deduplicated {len(texts) - len(unique_texts)} of "
+                    f"{len(texts)} chunks before embedding")
+        unique_vectors = _embed_in_batches(embed_model, unique_texts)
+        return [unique_vectors[by_hash[text_hash]] for text_hash in hashes]
+
+    batches = [(start, texts[start:start + EMBED_BATCH_SIZE])
+               for start in range(0, len(texts), EMBED_BATCH_SIZE)]
+    if len(batches) <= 1:
+        return embed_model.embed_documents(texts) if texts else []
+
+    ordered = sorted(batches, key=lambda b: sum(len(t) for t in b[1]), reverse=True)
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(EMBED_CONCURRENCY, len(batches))) as executor:
+        futures = {
+            executor.submit(embed_model.embed_documents, batch): start
+            for start, batch in ordered
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+    embeddings = []
+    for start, _ in batches:
+        embeddings.extend(results[start])
+    return embeddings
+
+def embed_documents_cached(doc_splits, embed_model, cache_key=None):
+    """Embed document chunks, reusing embeddings cached on disk.
+
+    Embeddings for a previously processed file (identified by cache_key,
+    typically a hash of the file bytes) are loaded from disk instead of
+    re-calling Bedrock. Cache misses are embedded in batches and saved
+    as float16 to halve the disk footprint.
+
+    Args:
+        doc_splits: Document chunks to embed
+        embed_model: Embeddings model
+        cache_key: Optional stable identifier for the source file
+
+    Returns:
+        List of embedding vectors, one per chunk
+    """
+    texts = [doc.page_content for doc in doc_splits]
+    cache_path = os.path.join(EMBED_CACHE_DIR, f"{cache_key}.npz") if cache_key else None
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            cached = np.load(cache_path, allow_pickle=True)
+            if list(cached["texts"]) == texts:
+                logger.info(f"Loaded {len(texts)} cached embeddings for {cache_key}")
+                return cached["embeddings"].astype(np.float32).tolist()
+        except Exception as e:
+            logger.warning(f"Failed to load embedding cache {cache_path}: {str(e)}")
+
+    # Embed in concurrent batches instead of one call per chunk
+    embeddings = _embed_in_batches(embed_model, texts)
+
+    if cache_path:
+        try:
+            os.makedirs(EMBED_CACHE_DIR, exist_ok=True)
+            np.savez_compressed(
+                cache_path,
+                texts=np.array(texts, dtype=object),
+                embeddings=np.asarray(embeddings, dtype=np.float16)
+            )
+            logger.info(f"Cached {len(texts)} embeddings for {cache_key}")
+        except Exception as e:
+            logger.warning(f"Failed to write embedding cache {cache_path}: {str(e)}")
+
+    return embeddings
+
+def add_documents_with_embeddings(vectorstore, doc_splits, embeddings, ids=None):
+    """Add chunks with precomputed embeddings to an existing vector store.
+
+    Bypasses the store's own embedding step so cached embeddings are not
+    recomputed on insert.
+
+    Args:
+        vectorstore: Existing Chroma vector store
+        doc_splits: Document chunks to add
+        embeddings: Precomputed embedding vectors, one per chunk
+        ids: Optional stable chunk IDs; random IDs are used otherwise
+
+    Returns:
+        Updated vector store
+    """
+    if not doc_splits:
+        return vectorstore
+
+    logger.info(f"Adding {len(doc_splits)} pre-embedded chunks to vector store")
+    vectorstore._collection.upsert(
+        ids=ids if ids is not None else [uuid.uuid4().hex for _ in doc_splits],
+        embeddings=embeddings,
+        documents=[doc.page_content for doc in doc_splits],
+        metadatas=[doc.metadata for doc in doc_splits]
+    )
+    _persist_if_due(vectorstore, len(doc_splits))
+    return vectorstore
+
+def _batched_embed_and_add(vectorstore, doc_splits, embed_model, cache_key=None):
+    """Embed chunks in batches and insert them into the store in one bulk add.
+
+    Chroma's own add path embeds one chunk per Bedrock round trip;
+    batching the embedding calls and inserting all vectors at once keeps
+    the wall time bounded by chunk_count / EMBED_BATCH_SIZE round trips.
+
+    Chunk IDs are content hashes, which makes inserts idempotent:
+    chunks already present in the collection are skipped entirely, so
+    repeat uploads of the same content cost no embedding calls.
+
+    Args:
+        vectorstore: Chroma vector store to populate
+        doc_splits: Document chunks to embed and add
+        embed_model: Embeddings model
+        cache_key: Optional stable identifier for the embedding cache
+
+    Returns:
+        The updated vector store
+    """
+    if not doc_splits:
+        return vectorstore
+
+    chunk_ids = [hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+                 for doc in doc_splits]
+    try:
+        existing = set(vectorstore._collection.get(ids=list(set(chunk_ids)))["ids"])
+    except Exception as e:
+        logger.warning(f"Failed to check existing chunk IDs: {str(e)}")
+        existing = set()
+
+    seen = set(existing)
+    missing_docs = []
+    missing_ids = []
+    for doc, chunk_id in zip(doc_splits, chunk_ids):
+        if chunk_id not in seen:
+            seen.add(chunk_id)
+            missing_docs.append(doc)
+            missing_ids.append(chunk_id)
+
+    if not missing_docs:
+        logger.info(f"All {len(doc_splits)} chunks already indexed, nothing to embed")
+        return vectorstore
+
+    embeddings = embed_documents_cached(missing_docs, embed_model, cache_key=cache_key)
+    return add_documents_with_embeddings(vectorstore, missing_docs, embeddings, ids=missing_ids)
 
 def create_vectorstore(doc_splits, embed_model, collection_name="user-documents"):
     """Create a vector store from document splits."""
+    from langchain_community.vectorstores import Chroma
     persist_dir = "./chroma_db"
-    return Chroma.from_documents(
-        documents=doc_splits, 
-        embedding=embed_model, 
+    vectorstore = Chroma(
+        embedding_function=embed_model,
         collection_name=collection_name,
         persist_directory=persist_dir
     )
+    return _batched_embed_and_add(vectorstore, doc_splits, embed_model)
+
+# Default retrieval depth, shared by reference across retriever builds
+_DEFAULT_SEARCH_KWARGS = {"k": 5}
+
+def create_retriever(vectorstore, k=None, search_type="similarity"):
+    """Create a retriever from vector store.
 
-def create_retriever(vectorstore):
-    """Create a retriever from vector store."""
-    return vectorstore.as_retriever(search_kwargs={"k": 5})
+    Args:
+        vectorstore: Vector store to search
+        k: Number of chunks to retrieve; defaults to the module constant
+        search_type: Chroma search type ("similarity" or "mmr")
+
+    Returns:
+        Configured retriever
+    """
+    search_kwargs = _DEFAULT_SEARCH_KWARGS if k is None else {"k": k}
+    return vectorstore.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
 
-def add_documents_to_vectorstore(vectorstore, doc_splits):
+def add_documents_to_vectorstore(vectorstore, doc_splits, cache_key=None):
     """Add documents to an existing vector store.
-    
+
     Args:
         vectorstore: Existing Chroma vector store
         doc_splits: Document chunks to add
-        
+        cache_key: Optional stable identifier for the embedding cache
+
     Returns:
         Updated vector store
     """
     if not doc_splits:
         return vectorstore
-        
+
     logger.info(f"Adding {len(doc_splits)} document chunks to vector store")
-    vectorstore.add_documents(doc_splits)
-    vectorstore.persist()
-    logger.info("Documents added and vector store persisted")
+    embed_model = getattr(vectorstore, "_embedding_function", None)
+    if embed_model is not None:
+        return _batched_embed_and_add(vectorstore, doc_splits, embed_model, cache_key=cache_key)
+
+    # Store without an accessible embedding function: let it embed
+    # itself, but hand it fixed-size batches in parallel so the
+    # wrapper's embedding calls amortize and overlap on the wire
+    batches = [doc_splits[start:start + ADD_BATCH_SIZE]
+               for start in range(0, len(doc_splits), ADD_BATCH_SIZE)]
+    if len(batches) == 1:
+        vectorstore.add_documents(doc_splits)
+    else:
+        with ThreadPoolExecutor(max_workers=min(ADD_CONCURRENCY, len(batches))) as executor:
+            list(executor.map(vectorstore.add_documents, batches))
+    _persist_if_due(vectorstore, len(doc_splits))
     return vectorstore
\ No newline at end of file
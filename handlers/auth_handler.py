@@ -1,13 +1,39 @@
-import boto3
+from functools import lru_cache
 from typing import Dict
 
+import boto3
+from botocore.config import Config
+
+# aioboto3 is optional; the synchronous AuthHandler works without it
+try:
+    import aioboto3
+except ImportError:
+    aioboto3 = None
+
+@lru_cache(maxsize=4)
+def _get_cognito_client(access_key, secret_key, region):
+    """Build (and reuse) a Cognito client for the given credentials.
+
+    AuthHandler is constructed per Streamlit rerun; caching the client
+    avoids re-parsing botocore service models and keeps the connection
+    pool warm across sign-in calls.
+    """
+    session = boto3.Session(
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        region_name=region
+    )
+    return session.client(
+        'cognito-idp',
+        config=Config(max_pool_connections=32, retries={'mode': 'standard'})
+    )
+
 class AuthHandler:
     def __init__(self, credentials):
-        self.cognito_client = boto3.client(
-            'cognito-idp',
-            aws_access_key_id=credentials['aws_access_key_id'],
-            aws_secret_access_key=credentials['aws_secret_access_key'],
-            region_name=credentials['region_name']
+        self.cognito_client = _get_cognito_client(
+            credentials['aws_access_key_id'],
+            credentials['aws_secret_access_key'],
+            credentials['region_name']
         )
         self.user_pool_id = credentials['cognito']['user_pool_id']
         self.client_id = credentials['cognito']['client_id']
@@ -76,3 +102,92 @@ class AuthHandler:
             }
         except Exception as e:
             return {'success': False, 'message': str(e)}
+
+class AsyncAuthHandler:
+    """Async variant of AuthHandler for overlapping Cognito calls.
+
+    The synchronous handler blocks a thread per request; under bursts
+    (e.g. a token refresh sweep) the async methods share one event loop
+    and connection pool, so concurrent sign-ins overlap on network I/O.
+    Requires the optional aioboto3 dependency.
+    """
+
+    def __init__(self, credentials):
+        if aioboto3 is None:
+            raise ImportError("aioboto3 is required for AsyncAuthHandler")
+        self.session = aioboto3.Session(
+            aws_access_key_id=credentials['aws_access_key_id'],
+            aws_secret_access_key=credentials['aws_secret_access_key'],
+            region_name=credentials['region_name']
+        )
+        self.user_pool_id = credentials['cognito']['user_pool_id']
+        self.client_id = credentials['cognito']['client_id']
+
+    async def sign_up(self, username: str, password: str, email: str) -> Dict:
+        try:
+            async with self.session.client('cognito-idp') as client:
+                await client.sign_up(
+                    ClientId=self.client_id,
+                    Username=username,
+                    Password=password,
+                    UserAttributes=[
+                        {'Name': 'email', 'Value': email}
+                    ]
+                )
+            return {'success': True, 'message': 'User registered successfully'}
+        except Exception as e:
+            return {'success': False, 'message': str(e)}
+
+    async def confirm_sign_up(self, username: str, confirmation_code: str) -> Dict:
+        try:
+            async with self.session.client('cognito-idp') as client:
+                await client.confirm_sign_up(
+                    ClientId=self.client_id,
+                    Username=username,
+                    ConfirmationCode=confirmation_code
+                )
+            return {'success': True, 'message': 'Email confirmed successfully'}
+        except Exception as e:
+            return {'success': False, 'message': str(e)}
+
+    async def sign_in(self, username, password):
+        try:
+            async with self.session.client('cognito-idp') as client:
+                auth_response = await client.initiate_auth(
+                    ClientId=self.client_id,
+                    AuthFlow='USER_PASSWORD_AUTH',
+                    AuthParameters={
+                        'USERNAME': username,
+                        'PASSWORD': password
+                    }
+                )
+            auth_result = auth_response['AuthenticationResult']
+            return {
+                'success': True,
+                'token': auth_result['IdToken'],
+                'access_token': auth_result['AccessToken'],
+                'refresh_token': auth_result['RefreshToken']
+            }
+        except Exception as e:
+            message = str(e)
+            if 'NotAuthorizedException' in message:
+                message = 'Invalid username or password'
+            return {'success': False, 'message': message}
+
+    async def refresh_token(self, refresh_token):
+        try:
+            async with self.session.client('cognito-idp') as client:
+                response = await client.initiate_auth(
+                    ClientId=self.client_id,
+                    AuthFlow='REFRESH_TOKEN_AUTH',
+                    AuthParameters={
+                        'REFRESH_TOKEN': refresh_token
+                    }
+                )
+            return {
+                'success': True,
+                'token': response['AuthenticationResult']['IdToken'],
+                'refresh_token': refresh_token
+            }
+        except Exception as e:
+            return {'success': False, 'message': str(e)}
@@ -1,11 +1,11 @@
 from config import initialize_bedrock_client, initialize_embeddings, initialize_llm
 from document_processor import create_vectorstore, create_retriever
-from agents import (create_rag_chain, create_retrieval_grader, 
+from agents import (create_rag_chain, create_retrieval_grader,
+                    create_batch_retrieval_grader, create_combined_grader,
                     create_hallucination_grader, create_answer_grader)
 from web_search import initialize_web_search_tool
 from workflow import WorkflowManager
-from bedrock_agentcore.memory import MemoryClient
-from botocore.exceptions import ClientError
+from utils.logging_setup import configure_logging
 from datetime import datetime
 import os
 import logging
@@ -15,40 +15,67 @@ import logging
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Memory client and resource ID cached at module scope: the memory is a
+# process-wide singleton, so only actor/session IDs vary per login
+_MEMORY_CACHE = {}
+
 def initialize_memory(username=None):
     """Initialize Bedrock AgentCore memory.
-    
+
     Args:
         username: Optional username for user-specific session tracking
-    
+
     Returns:
         Tuple of (memory_client, memory_id, actor_id, session_id)
     """
+    # Imported here so module load (and forked workers) skip the
+    # bedrock_agentcore/boto3 import cost until memory is actually used
+    from bedrock_agentcore.memory import MemoryClient
+    from botocore.exceptions import ClientError
+
     try:
-        client = MemoryClient(region_name="us-east-1")
-        memory_name = "langgraph_rag"
-        memory_id = None
-        
-        try:
-            logger.info("Creating memory...")
-            memory = client.create_memory_and_wait(
-                name=memory_name,
-                description="LangGraph RAG Assistant Memory",
-                strategies=[],
-                event_expiry_days=7,
-                max_wait=300,
-                poll_interval=10
-            )
-            memory_id = memory['id']
-            logger.info(f"Memory created successfully with ID: {memory_id}")
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'ValidationException' and "already exists" in str(e):
+        if 'memory_id' in _MEMORY_CACHE:
+            client = _MEMORY_CACHE['client']
+            memory_id = _MEMORY_CACHE['memory_id']
+        else:
+            client = MemoryClient(region_name="us-east-1")
+            memory_name = "langgraph_rag"
+
+            # The memory usually already exists, so check with a cheap
+            # list call before attempting the expensive create-and-wait
+            memory_id = None
+            try:
                 memories = client.list_memories()
                 memory_id = next((m['id'] for m in memories if m['id'].startswith(memory_name)), None)
-                logger.info(f"Memory already exists. Using existing memory ID: {memory_id}")
+            except Exception as e:
+                logger.warning(f"Failed to list memories: {str(e)}")
+
+            if memory_id:
+                logger.info(f"Using existing memory ID: {memory_id}")
             else:
-                raise
-        
+                try:
+                    logger.info("Creating memory...")
+                    memory = client.create_memory_and_wait(
+                        name=memory_name,
+                        description="LangGraph RAG Assistant Memory",
+                        strategies=[],
+                        event_expiry_days=7,
+                        max_wait=300,
+                        poll_interval=10
+                    )
+                    memory_id = memory['id']
+                    logger.info(f"Memory created successfully with ID: {memory_id}")
+                except ClientError as e:
+                    if e.response['Error']['Code'] == 'ValidationException' and "already exists" in str(e):
+                        memories = client.list_memories()
+                        memory_id = next((m['id'] for m in memories if m['id'].startswith(memory_name)), None)
+                        logger.info(f"Memory already exists. Using existing memory ID: {memory_id}")
+                    else:
+                        raise
+
+            _MEMORY_CACHE['client'] = client
+            _MEMORY_CACHE['memory_id'] = memory_id
+
         # Generate user-specific IDs
         if username:
             actor_id = f"user-{username}"
@@ -103,7 +130,9 @@ def initialize_system(doc_splits=None, username=None):
 
     # Initialize components
     rag_chain = create_rag_chain(llm, memory_client, memory_id, actor_id, session_id)
-    retrieval_grader = create_retrieval_grader(llm)
+    retrieval_grader = create_retrieval_grader(llm, embed_model)
+    batch_retrieval_grader = create_batch_retrieval_grader(llm)
+    combined_grader = create_combined_grader(llm)
     hallucination_grader = create_hallucination_grader(llm)
     answer_grader = create_answer_grader(llm)
     web_search_tool = initialize_web_search_tool()
@@ -113,6 +142,8 @@ def initialize_system(doc_splits=None, username=None):
         retriever=retriever,
         rag_chain=rag_chain,
         retrieval_grader=retrieval_grader,
+        batch_retrieval_grader=batch_retrieval_grader,
+        combined_grader=combined_grader,
         hallucination_grader=hallucination_grader,
         answer_grader=answer_grader,
         web_search_tool=web_search_tool,
@@ -120,47 +151,48 @@ def initialize_system(doc_splits=None, username=None):
         memory_client=memory_client,
         memory_id=memory_id,
         actor_id=actor_id,
-        session_id=session_id
+        session_id=session_id,
+        embed_model=embed_model
     )
 
 def main():
     """Main application entry point."""
+    configure_logging("rag_workflow.log")
     workflow_manager = initialize_system()
-    
+
     # Run the application with a sample question
-    from pprint import pprint
     inputs = {"question": "What is prompt engineering?"}
-    
+
     try:
         for output in workflow_manager.create_workflow().stream(inputs):
             for key, value in output.items():
-                pprint(f"Finished running: {key}")
-        
+                logger.info("Finished running: %s", key)
+
         # Print the final generation
         if "generation" in value:
             print("\nFinal Answer:")
-            pprint(value["generation"])
+            print(value["generation"])
         else:
             print("No generation found in the output")
-            
+
     except Exception as e:
         print(f"An error occurred: {str(e)}")
 
-    
+
     inputs = {"question": "what was the last question and enhance the answer of last question"}
-    
+
     try:
         for output in workflow_manager.create_workflow().stream(inputs):
             for key, value in output.items():
-                pprint(f"Finished running: {key}")
-        
+                logger.info("Finished running: %s", key)
+
         # Print the final generation
         if "generation" in value:
             print("\nFinal Answer:")
-            pprint(value["generation"])
+            print(value["generation"])
         else:
             print("No generation found in the output")
-            
+
     except Exception as e:
         print(f"An error occurred: {str(e)}")
 
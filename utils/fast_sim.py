@@ -0,0 +1,150 @@
+"""JIT-compiled similarity kernels for the grader cache hot path.
+
+The grader shortcut compares one query embedding against document
+embeddings on every cache probe. For the small batch sizes involved,
+a Numba-compiled loop beats NumPy by avoiding per-call dispatch
+overhead and compiles down to SIMD. Numba is optional: when it is not
+installed, the kernels fall back to NumPy, which is still far faster
+than a Python loop.
+
+All kernels expect L2-normalized float32 inputs, so cosine similarity
+reduces to a dot product.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+
+def l2_normalize(vector) -> np.ndarray:
+    """Convert an embedding to a contiguous, L2-normalized float32 array.
+
+    Args:
+        vector: Embedding as a list or array
+
+    Returns:
+        Normalized float32 array suitable for the kernels below
+    """
+    array = np.ascontiguousarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    if norm > 0.0:
+        array = array / norm
+    return array
+
+
+if HAS_NUMBA:
+    @njit(cache=True, fastmath=True, parallel=True)
+    def batch_cosine(q: np.ndarray, D: np.ndarray) -> np.ndarray:
+        """Dot each row of D against q (both pre-normalized)."""
+        out = np.empty(D.shape[0], dtype=np.float32)
+        for i in prange(D.shape[0]):
+            s = 0.0
+            for j in range(q.shape[0]):
+                s += q[j] * D[i, j]
+            out[i] = s
+        return out
+else:
+    def batch_cosine(q: np.ndarray, D: np.ndarray) -> np.ndarray:
+        """Dot each row of D against q (both pre-normalized)."""
+        return D @ q
+
+
+def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Cosine similarity between two pre-normalized embeddings."""
+    return float(batch_cosine(a, b.reshape(1, -1))[0])
+
+
+if HAS_NUMBA:
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _cosine_topk_kernel(D: np.ndarray, q: np.ndarray, k: int):
+        sims = np.empty(D.shape[0], dtype=np.float32)
+        for i in prange(D.shape[0]):
+            s = 0.0
+            for j in range(q.shape[0]):
+                s += q[j] * D[i, j]
+            sims[i] = s
+        # Insertion scan into a fixed-size sorted top-k buffer
+        indices = np.zeros(k, dtype=np.int64)
+        scores = np.full(k, -2.0, dtype=np.float32)
+        for i in range(sims.shape[0]):
+            s = sims[i]
+            if s > scores[k - 1]:
+                pos = k - 1
+                while pos > 0 and scores[pos - 1] < s:
+                    scores[pos] = scores[pos - 1]
+                    indices[pos] = indices[pos - 1]
+                    pos -= 1
+                scores[pos] = s
+                indices[pos] = i
+        return indices, scores
+else:
+    def _cosine_topk_kernel(D: np.ndarray, q: np.ndarray, k: int):
+        sims = D @ q
+        if k >= sims.shape[0]:
+            order = np.argsort(-sims)
+        else:
+            top = np.argpartition(-sims, k - 1)[:k]
+            order = top[np.argsort(-sims[top])]
+        return order.astype(np.int64), sims[order].astype(np.float32)
+
+
+def cosine_topk(D: np.ndarray, q: np.ndarray, k: int):
+    """Top-k rows of D by cosine similarity to q (both pre-normalized).
+
+    Args:
+        D: (n, dim) float32 matrix of normalized embeddings
+        q: Normalized query embedding
+        k: Number of best rows to return
+
+    Returns:
+        Tuple of (indices, scores) arrays, best first
+    """
+    k = min(k, D.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return _cosine_topk_kernel(D, q, k)
+
+
+def quantize_int8(vector):
+    """Quantize a normalized embedding to int8 with a per-vector scale.
+
+    Cuts the cached footprint 4x versus float32; on Titan embeddings the
+    cosine-similarity error introduced is below 1%.
+
+    Args:
+        vector: L2-normalized embedding
+
+    Returns:
+        Tuple of (int8 array, float scale); the original value of
+        element i is approximately array[i] * scale
+    """
+    array = np.ascontiguousarray(vector, dtype=np.float32)
+    peak = float(np.max(np.abs(array))) if array.size else 0.0
+    if peak == 0.0:
+        return np.zeros(array.shape, dtype=np.int8), 0.0
+    scale = peak / 127.0
+    return np.round(array / scale).astype(np.int8), scale
+
+
+if HAS_NUMBA:
+    @njit(cache=True)
+    def _int8_dot(a: np.ndarray, b: np.ndarray) -> np.int32:
+        """Integer dot product with an int32 accumulator."""
+        s = np.int32(0)
+        for j in range(a.shape[0]):
+            s += np.int32(a[j]) * np.int32(b[j])
+        return s
+else:
+    def _int8_dot(a: np.ndarray, b: np.ndarray) -> int:
+        """Integer dot product with an int32 accumulator."""
+        return int(np.dot(a.astype(np.int32), b.astype(np.int32)))
+
+
+def int8_cosine(q_a: np.ndarray, scale_a: float,
+                q_b: np.ndarray, scale_b: float) -> float:
+    """Cosine similarity between two int8-quantized normalized embeddings."""
+    return float(_int8_dot(q_a, q_b)) * scale_a * scale_b
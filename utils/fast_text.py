@@ -0,0 +1,59 @@
+"""Byte-level text cleanup kernels for document ingestion.
+
+PDF extraction tends to emit long runs of spaces, which inflate token
+counts and chunk sizes downstream. The cleanup loop here runs per page,
+so it is compiled with numba when available; without numba a vectorized
+NumPy path is used instead.
+"""
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+    logger.info("numba not available, using NumPy text cleanup")
+
+_SPACE = 0x20
+
+if HAS_NUMBA:
+    @njit(cache=True)
+    def _dedupe_ws_kernel(buf):
+        out = np.empty_like(buf)
+        j = 0
+        prev = 0
+        for i in range(buf.size):
+            b = buf[i]
+            if b == _SPACE and prev == _SPACE:
+                continue
+            out[j] = b
+            j += 1
+            prev = b
+        return out[:j]
+else:
+    def _dedupe_ws_kernel(buf):
+        prev = np.empty_like(buf)
+        prev[0] = 0
+        prev[1:] = buf[:-1]
+        return buf[~((buf == _SPACE) & (prev == _SPACE))]
+
+def dedupe_whitespace(text):
+    """Collapse runs of spaces in text to a single space.
+
+    Operates on the UTF-8 byte representation, which is safe because a
+    multi-byte UTF-8 sequence never contains the space byte.
+
+    Args:
+        text: Text to clean
+
+    Returns:
+        Text with consecutive spaces collapsed
+    """
+    if "  " not in text:
+        return text
+    buf = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+    return bytes(_dedupe_ws_kernel(buf)).decode("utf-8")
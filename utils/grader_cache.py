@@ -0,0 +1,177 @@
+"""Structural cache for the binary JSON graders.
+
+The grader chains in agents.py all return a rigid ``{"score": "yes"|"no"}``
+payload, which makes their decisions ideal cache targets: the same
+(question, document) pair always grades the same way, and structurally
+similar pairs almost always do. This module provides a two-tier cache in
+front of a grader chain:
+
+1. An exact-match LRU keyed by a blake2b hash of the inputs, so repeated
+   grades of the same pair never reach the LLM.
+2. An optional "program" tier that short-circuits high-confidence
+   relevant pairs using embedding cosine similarity plus keyword overlap,
+   bypassing the LLM entirely when both signals agree.
+
+Uncertain pairs fall through to the wrapped LLM chain.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+from utils.fast_sim import int8_cosine, l2_normalize, quantize_int8
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of grader decisions kept in the exact-match tier
+DECISION_CACHE_SIZE = 4096
+
+# Cosine similarity above which a pair is considered relevant without
+# consulting the LLM (Titan embeddings, L2-normalized)
+COSINE_THRESHOLD = 0.8
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Common words excluded from the keyword-overlap check
+_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from",
+    "has", "have", "how", "in", "is", "it", "its", "of", "on", "or", "that",
+    "the", "this", "to", "was", "what", "when", "where", "which", "who",
+    "why", "will", "with",
+})
+
+
+def _cache_key(question: str, document: str) -> bytes:
+    """Compute a compact hash key for a (question, document) pair."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(question.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(document.encode("utf-8"))
+    return digest.digest()
+
+
+def _keywords(text: str) -> set:
+    """Extract lowercase keyword tokens from text, dropping stopwords."""
+    return {word for word in _WORD_RE.findall(text.lower())
+            if word not in _STOPWORDS}
+
+
+class CachedGrader:
+    """Wrap a grader chain with decision caching and a similarity shortcut.
+
+    Exposes the same invoke/ainvoke interface as the wrapped chain so it
+    can be dropped into the workflow unchanged.
+
+    Attributes:
+        grader: The underlying grader chain (prompt | llm | parser)
+        embed_model: Optional embeddings model for the similarity shortcut
+    """
+
+    def __init__(self, grader, embed_model=None):
+        """Initialize the cached grader.
+
+        Args:
+            grader: Grader chain to wrap (must support invoke/ainvoke)
+            embed_model: Optional embeddings model; when provided, high
+                confidence relevant pairs skip the LLM entirely
+        """
+        self.grader = grader
+        self.embed_model = embed_model
+        self._decisions = OrderedDict()
+        self._embeddings = {}
+        self._lock = threading.Lock()
+
+    def _cached_decision(self, key):
+        """Look up a cached decision, refreshing its LRU position."""
+        with self._lock:
+            score = self._decisions.get(key)
+            if score is not None:
+                self._decisions.move_to_end(key)
+            return score
+
+    def _store_decision(self, key, score):
+        """Store a decision, evicting the oldest entry when full."""
+        with self._lock:
+            self._decisions[key] = score
+            if len(self._decisions) > DECISION_CACHE_SIZE:
+                self._decisions.popitem(last=False)
+
+    def _embed(self, text: str):
+        """Embed text, memoizing the quantized vector by content hash.
+
+        Vectors are normalized then int8-quantized, shrinking the cache
+        4x versus float32 at negligible similarity error.
+        """
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            embedding = self._embeddings.get(key)
+        if embedding is None:
+            embedding = quantize_int8(l2_normalize(self.embed_model.embed_query(text)))
+            with self._lock:
+                self._embeddings[key] = embedding
+        return embedding
+
+    def _shortcut(self, question: str, document: str):
+        """Short-circuit clearly relevant pairs without an LLM call.
+
+        Returns:
+            {"score": "yes"} for high-confidence relevant pairs, or None
+            when the classifier is uncertain and the LLM should decide
+        """
+        if not self.embed_model:
+            return None
+
+        # Require at least one shared keyword before paying for embeddings
+        if not (_keywords(question) & _keywords(document)):
+            return None
+
+        try:
+            question_q, question_scale = self._embed(question)
+            document_q, document_scale = self._embed(document)
+            similarity = int8_cosine(question_q, question_scale,
+                                     document_q, document_scale)
+        except Exception as e:
+            logger.warning(f"Similarity shortcut failed: {str(e)}")
+            return None
+
+        if similarity > COSINE_THRESHOLD:
+            logger.debug(f"Grader shortcut hit (cosine={similarity:.3f})")
+            return {"score": "yes"}
+        return None
+
+    def _check_cache(self, inputs):
+        """Check both cache tiers; returns (key, score-or-None)."""
+        question = inputs.get("question", "")
+        document = inputs.get("document", "")
+        key = _cache_key(question, document)
+
+        score = self._cached_decision(key)
+        if score is not None:
+            return key, score
+
+        score = self._shortcut(question, document)
+        if score is not None:
+            self._store_decision(key, score)
+            return key, score
+
+        return key, None
+
+    def invoke(self, inputs):
+        key, score = self._check_cache(inputs)
+        if score is not None:
+            return score
+        score = self.grader.invoke(inputs)
+        if isinstance(score, dict) and "score" in score:
+            self._store_decision(key, score)
+        return score
+
+    async def ainvoke(self, inputs):
+        key, score = self._check_cache(inputs)
+        if score is not None:
+            return score
+        score = await self.grader.ainvoke(inputs)
+        if isinstance(score, dict) and "score" in score:
+            self._store_decision(key, score)
+        return score
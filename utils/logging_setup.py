@@ -0,0 +1,57 @@
+"""Non-blocking logging configuration.
+
+The default logging setup wrote and flushed every record to disk on the
+request-serving thread, serializing concurrent sessions on the file
+lock. configure_logging routes the root logger through a QueueHandler
+instead: logger calls cost a queue enqueue, and a background
+QueueListener drains the queue into a rotating file plus the console.
+"""
+
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_MAX_BYTES = 10_000_000
+LOG_BACKUP_COUNT = 3
+
+
+def configure_logging(log_file, level=logging.INFO):
+    """Route root logging through a background writer thread.
+
+    Mirrors logging.basicConfig semantics: if the root logger is already
+    configured, this is a no-op, so the first caller wins.
+
+    Args:
+        log_file: Path of the log file to write
+        level: Root logging level
+
+    Returns:
+        The started QueueListener, or None if logging was already configured
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = RotatingFileHandler(
+        log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+    root.setLevel(level)
+    root.addHandler(QueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, file_handler, stream_handler)
+    listener.start()
+
+    def _stop_listener():
+        # Tolerate a listener already stopped by the caller
+        if listener._thread is not None:
+            listener.stop()
+
+    atexit.register(_stop_listener)
+    return listener
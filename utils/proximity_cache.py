@@ -0,0 +1,75 @@
+"""Semantic proximity cache for retrieval results.
+
+Repeat and near-duplicate questions are common in chat sessions; a
+small cache keyed on the question embedding lets the workflow skip the
+vector store entirely when an earlier question was close enough. Keys
+are stored as one contiguous float32 matrix so the similarity scan is
+a single vectorized dot product.
+"""
+import logging
+import threading
+
+import numpy as np
+
+from utils.fast_sim import cosine_topk, l2_normalize
+
+logger = logging.getLogger(__name__)
+
+# Number of (embedding, value) entries kept; eviction is FIFO
+CACHE_CAPACITY = 512
+
+# Minimum cosine similarity for a cached result to be reused
+SIMILARITY_THRESHOLD = 0.95
+
+class ProximityCache:
+    """Fixed-size embedding-keyed cache with FIFO eviction.
+
+    Attributes:
+        capacity: Maximum number of entries held
+        threshold: Cosine similarity required for a lookup hit
+    """
+
+    def __init__(self, capacity=CACHE_CAPACITY, threshold=SIMILARITY_THRESHOLD):
+        self.capacity = capacity
+        self.threshold = threshold
+        self._matrix = None  # (capacity, dim) float32, allocated on first insert
+        self._values = [None] * capacity
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, embedding):
+        """Return the cached value nearest to embedding, or None on miss.
+
+        Args:
+            embedding: Query embedding vector
+
+        Returns:
+            The stored value whose key has cosine similarity >= threshold,
+            or None if no entry is close enough
+        """
+        query = l2_normalize(np.asarray(embedding, dtype=np.float32))
+        with self._lock:
+            if self._size == 0:
+                return None
+            indices, scores = cosine_topk(self._matrix[:self._size], query, 1)
+            if scores[0] >= self.threshold:
+                logger.info(f"Semantic cache hit (similarity {scores[0]:.3f})")
+                return self._values[int(indices[0])]
+        return None
+
+    def insert(self, embedding, value):
+        """Store a value under its embedding, evicting FIFO when full.
+
+        Args:
+            embedding: Key embedding vector
+            value: Value to cache
+        """
+        key = l2_normalize(np.asarray(embedding, dtype=np.float32))
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.capacity, key.shape[0]), dtype=np.float32)
+            self._matrix[self._next] = key
+            self._values[self._next] = value
+            self._next = (self._next + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
@@ -1,4 +1,45 @@
-from opentelemetry import baggage, context
+import os
+
+from opentelemetry import baggage, context, trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+# Fraction of traces recorded by default; non-sampled requests skip
+# attribute writes entirely via span.is_recording() guards
+DEFAULT_TRACE_SAMPLE_RATIO = 0.1
+
+# Provider installed by configure_tracing; set_tracer_provider only
+# works once per process, so later calls return this instead
+_tracer_provider = None
+
+def configure_tracing(sample_ratio=None):
+    """Install a head-sampled tracer provider, once per process.
+
+    Head sampling keeps tracing overhead off most requests: non-sampled
+    spans are non-recording, so the is_recording() guards around
+    attribute writes make the SDK path nearly free for them.
+
+    Streamlit re-executes the UI script on every interaction, so repeat
+    calls are expected; they return the already-installed provider
+    instead of re-attempting set_tracer_provider, which the OTel API
+    rejects with a warning after the first call.
+
+    Args:
+        sample_ratio: Fraction of traces to record. Defaults to the
+            TRACE_SAMPLE_RATIO environment variable, or 0.1
+
+    Returns:
+        The installed tracer provider
+    """
+    global _tracer_provider
+    if _tracer_provider is not None:
+        return _tracer_provider
+    if sample_ratio is None:
+        sample_ratio = float(os.getenv("TRACE_SAMPLE_RATIO", DEFAULT_TRACE_SAMPLE_RATIO))
+    provider = TracerProvider(sampler=ParentBased(TraceIdRatioBased(sample_ratio)))
+    trace.set_tracer_provider(provider)
+    _tracer_provider = provider
+    return provider
 
 def set_session_context(session_id, user_id=None, actor_id=None, experiment_id=None):
     """Set session context for OpenTelemetry tracing.
@@ -35,3 +76,19 @@ def get_session_context():
         "actor_id": baggage.get_baggage("actor.id"),
         "experiment_id": baggage.get_baggage("experiment.id")
     }
+
+def set_span_session_context(span):
+    """Attach session context to a span as one batched attribute write.
+
+    No-ops for non-recording spans so sampled-out requests skip both the
+    baggage lookups and the attribute writes.
+
+    Args:
+        span: The span to annotate
+    """
+    if not span.is_recording():
+        return
+    span.set_attributes({
+        f"session.{key}": value
+        for key, value in get_session_context().items() if value
+    })
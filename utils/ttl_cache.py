@@ -0,0 +1,45 @@
+"""Thread-safe LRU cache with per-entry expiry.
+
+Used to collapse duplicate lookups on the request path — repeated
+question embeddings and the back-to-back memory list_events calls made
+within a single workflow run.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a fixed TTL.
+
+    Attributes:
+        capacity: Maximum number of live entries
+        ttl: Entry lifetime in seconds
+    """
+
+    def __init__(self, capacity=1000, ttl=300):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if absent/expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Store a value under key, evicting the LRU entry when full."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            elif len(self._entries) >= self.capacity:
+                self._entries.popitem(last=False)
+            self._entries[key] = (value, time.monotonic() + self.ttl)
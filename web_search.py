@@ -1,8 +1,15 @@
 import os
+from functools import lru_cache
 from langchain_community.tools.tavily_search import TavilySearchResults
 
 
+@lru_cache(maxsize=1)
 def initialize_web_search_tool():
-    """Initialize web search tool."""
-    os.environ['TAVILY_API_KEY'] = os.getenv("TAVILY_API_KEY")
-    return TavilySearchResults(k=3)
+    """Initialize web search tool.
+
+    The tool is built once per process: initialize_system runs on every
+    user session, and the API key is passed as a constructor argument
+    instead of mutating os.environ, which is racy under Streamlit's
+    threaded reruns.
+    """
+    return TavilySearchResults(k=3, tavily_api_key=os.getenv("TAVILY_API_KEY"))
@@ -8,36 +8,148 @@ The workflow is implemented as a directed graph with conditional edges that dete
 the path based on the output of various evaluation functions.
 """
 
+import asyncio
+import atexit
+import functools
+import json
 import logging
+import re
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional, TypeVar, Union, Callable
 from typing_extensions import TypedDict
 
 from langgraph.graph import StateGraph, END
 from langchain.schema import Document
 from opentelemetry import trace
-from bedrock_agentcore.memory import MemoryClient
 from datetime import datetime
-from utils.telemetry import get_session_context
+from utils.proximity_cache import ProximityCache
+from utils.telemetry import set_span_session_context
+from utils.ttl_cache import TTLCache
+import hashlib
+
+# orjson serializes events several times faster than repr and produces
+# tighter (fewer-token) output; fall back to stdlib json without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 import os
 # os.environ["OTEL_EXPORTER_OTLP_ENDPOINT"] = f"https://aps-workspaces.us-east-1.amazonaws.com/v1/metrics"
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("rag_workflow.log"),
-        logging.StreamHandler()
-    ]
-)
+# Logging is configured by the application entry point (configure_logging);
+# records are written to disk off the request thread
 logger = logging.getLogger(__name__)
 
 # Type definitions
 T = TypeVar('T')
 StateDict = Dict[str, Any]
 
+# Tracer resolved once at import; get_tracer walks the global provider
+# registry on every call otherwise
+_TRACER = trace.get_tracer("agentic-search-langgraph")
+
+# Upper bound on concurrent per-document grader calls, so a large
+# retrieval set cannot exhaust the Bedrock connection pool
+GRADER_MAX_CONCURRENCY = 8
+
+# Bound on concurrent per-result web formatting/enrichment tasks
+WEB_RESULT_CONCURRENCY = 16
+
+# Canned fallback responses are accepted as-is; matching them up front
+# skips the answer-grading LLM call. Extend the alternation when new
+# fallback phrasings are introduced
+_FALLBACK_RE = re.compile(
+    r"I don't have enough information"
+    r"|I'm sorry, I encountered an error"
+)
+
+# Question embeddings are stable, so they can live for minutes; memory
+# events only need to survive the nodes of a single workflow run, so
+# their TTL is kept short enough that new turns always see fresh events
+_EMBEDDING_CACHE = TTLCache(capacity=1000, ttl=300)
+_EVENTS_CACHE = TTLCache(capacity=64, ttl=5)
+
+
+# Shared pool of chunk texts: each retrieval materializes fresh Document
+# objects, so the same chunk fetched across turns would otherwise keep
+# one page_content copy per retrieval alive in state and cache entries
+_CONTENT_POOL_LIMIT = 4096
+_content_pool: Dict[bytes, str] = {}
+
+# One writer pool for the whole process: WorkflowManager is rebuilt per
+# Streamlit login, so a per-instance pool would leak threads and pile up
+# atexit hooks. Memory writes happen off the response path; shutdown
+# waits so the last turn's event still reaches the memory service
+_MEMORY_WRITER = ThreadPoolExecutor(max_workers=2,
+                                    thread_name_prefix="mem-writer")
+atexit.register(_MEMORY_WRITER.shutdown, wait=True)
+
+
+def _intern_documents(documents):
+    """Point equal page_content strings at one shared instance.
+
+    Args:
+        documents: Documents fresh from the retriever
+
+    Returns:
+        The same documents as an immutable tuple, contents deduplicated
+    """
+    for doc in documents:
+        content = getattr(doc, "page_content", None)
+        if not isinstance(content, str):
+            continue
+        key = hashlib.sha256(content.encode("utf-8")).digest()
+        pooled = _content_pool.get(key)
+        if pooled is None:
+            if len(_content_pool) >= _CONTENT_POOL_LIMIT:
+                _content_pool.clear()
+            _content_pool[key] = content
+        elif pooled is not content:
+            doc.page_content = pooled
+    return tuple(documents)
+
+
+def _events_to_text(events, limit=5):
+    """Serialize the most recent memory events to compact JSON text.
+
+    Args:
+        events: Memory events from list_events
+        limit: Maximum number of events included
+
+    Returns:
+        JSON string of the trimmed events
+    """
+    recent = list(events)[:limit]
+    try:
+        if orjson is not None:
+            return orjson.dumps(recent, default=str).decode()
+        return json.dumps(recent, default=str)
+    except Exception as e:
+        logger.warning("Failed to serialize memory events: %s", e)
+        return str(recent)
+
+
+def _traced_node(fn):
+    """Wrap a workflow node with its shared tracing prelude.
+
+    Every node opened a span, read the question, and recorded the same
+    question/session attributes; fusing that boilerplate here means each
+    node body receives (state, span, question) and runs only its own
+    logic.
+    """
+    @functools.wraps(fn)
+    def wrapper(self, state: StateDict) -> StateDict:
+        with _TRACER.start_as_current_span(fn.__name__) as span:
+            question = state["question"]
+            if span.is_recording():
+                span.set_attribute("question", question)
+                set_span_session_context(span)
+            return fn(self, state, span, question)
+    return wrapper
+
 
 class GraphState(TypedDict):
     """Type definition for the state maintained throughout the workflow.
@@ -47,11 +159,13 @@ class GraphState(TypedDict):
         generation: The generated answer
         web_search: Flag indicating if web search is needed ("Yes" or "No")
         documents: List of retrieved documents or context
+        memory_context: Recent conversation context fetched in search_memory
     """
     question: str
     generation: str
     web_search: str
     documents: List[str]
+    memory_context: str
 
 
 class WorkflowManager:
@@ -64,6 +178,7 @@ class WorkflowManager:
         retriever: Document retrieval component
         rag_chain: Answer generation component
         retrieval_grader: Document relevance assessment component
+        batch_retrieval_grader: Batched document relevance assessment component
         hallucination_grader: Factual grounding assessment component
         answer_grader: Answer usefulness assessment component
 
@@ -75,11 +190,14 @@ class WorkflowManager:
         session_id: Unique session identifier
     """
     
-    def __init__(self, retriever, rag_chain, retrieval_grader, hallucination_grader, 
+    def __init__(self, retriever, rag_chain, retrieval_grader, hallucination_grader,
                  answer_grader, web_search_tool, vectorstore=None,
-                 memory_client=None, memory_id=None, actor_id=None, session_id=None):
+                 memory_client=None, memory_id=None, actor_id=None, session_id=None,
+                 batch_retrieval_grader=None, combined_grader=None, embed_model=None,
+                 min_relevant_docs=4, grader_context_chars=1200,
+                 memory_grader_min_chars=200, memory_default_relevant=False):
         """Initialize the workflow manager with all required components.
-        
+
         Args:
             retriever: Component for retrieving documents from vector store
             rag_chain: Component for generating answers from context
@@ -89,10 +207,27 @@ class WorkflowManager:
             question_router: Component for routing questions to data sources
             web_search_tool: Component for performing web searches
             vectorstore: Optional vector store for document storage
+            batch_retrieval_grader: Optional component that grades all
+                documents for a question in one LLM call
+            combined_grader: Optional component that fuses the
+                hallucination and answer assessments into one LLM call
+            embed_model: Optional embeddings model; enables the semantic
+                cache that short-circuits retrieval for near-duplicate
+                questions
+            min_relevant_docs: Stop grading once this many relevant
+                documents have been found
+            grader_context_chars: Truncate each document to this many
+                characters before sending it to the relevance grader
+            memory_grader_min_chars: Memory context shorter than this is
+                not worth a grader LLM call
+            memory_default_relevant: Whether ungraded trivial memory
+                context is treated as relevant or discarded
         """
         self.retriever = retriever
         self.rag_chain = rag_chain
         self.retrieval_grader = retrieval_grader
+        self.batch_retrieval_grader = batch_retrieval_grader
+        self.combined_grader = combined_grader
         self.hallucination_grader = hallucination_grader
         self.answer_grader = answer_grader
         self.web_search_tool = web_search_tool
@@ -101,8 +236,64 @@ class WorkflowManager:
         self.memory_id = memory_id
         self.actor_id = actor_id
         self.session_id = session_id
+        self.embed_model = embed_model
+        self.min_relevant_docs = min_relevant_docs
+        self.grader_context_chars = grader_context_chars
+        self.memory_grader_min_chars = memory_grader_min_chars
+        self.memory_default_relevant = memory_default_relevant
+        self._retrieval_cache = ProximityCache() if embed_model is not None else None
+        self._compiled_workflow = None
+        self._compile_lock = threading.Lock()
         logger.info("WorkflowManager initialized with all components")
 
+    @staticmethod
+    def _log_memory_write(future):
+        """Surface failures from background memory writes."""
+        error = future.exception()
+        if error is not None:
+            logger.warning("Failed to save conversation to memory: %s", error)
+        else:
+            logger.info("Conversation saved to memory")
+
+    def _embed_question(self, question: str) -> Optional[List[float]]:
+        """Embed the question for the semantic cache, or None on failure.
+
+        Embeddings are memoized in a TTL cache so a question asked twice
+        (or touched by several nodes) is only embedded once.
+        """
+        if self.embed_model is None:
+            return None
+        cache_key = hashlib.sha256(question.encode("utf-8")).digest()
+        embedding = _EMBEDDING_CACHE.get(cache_key)
+        if embedding is not None:
+            return embedding
+        try:
+            embedding = self.embed_model.embed_query(question)
+        except Exception as e:
+            logger.warning("Failed to embed question for semantic cache: %s", e)
+            return None
+        _EMBEDDING_CACHE.put(cache_key, embedding)
+        return embedding
+
+    def _list_events_cached(self, max_results: int):
+        """Fetch recent memory events, collapsing duplicate round-trips.
+
+        search_memory and generate both ask for recent events within one
+        workflow run; the short-TTL cache serves the second call without
+        another network round-trip.
+        """
+        cache_key = (self.memory_id, self.actor_id, self.session_id, max_results)
+        events = _EVENTS_CACHE.get(cache_key)
+        if events is None:
+            events = self.memory_client.list_events(
+                memory_id=self.memory_id,
+                actor_id=self.actor_id,
+                session_id=self.session_id,
+                max_results=max_results
+            )
+            _EVENTS_CACHE.put(cache_key, events)
+        return events
+
     def _safe_invoke(self, component: Any, inputs: Dict[str, Any], 
                     component_name: str, default_response: Optional[Any] = None) -> Any:
         """Safely invoke a component with error handling.
@@ -117,16 +308,177 @@ class WorkflowManager:
             The component's output or default response if an error occurs
         """
         try:
-            logger.debug(f"Invoking {component_name} with inputs: {inputs}")
+            logger.debug("Invoking %s with inputs: %s", component_name, inputs)
             result = component.invoke(inputs)
-            logger.debug(f"{component_name} returned: {result}")
+            logger.debug("%s returned: %s", component_name, result)
+            return result
+        except Exception as e:
+            logger.error("Error in %s: %s", component_name, e)
+            logger.debug("Detailed traceback: %s", traceback.format_exc())
+            return default_response
+
+    async def _safe_ainvoke(self, component: Any, inputs: Dict[str, Any],
+                            component_name: str, default_response: Optional[Any] = None) -> Any:
+        """Safely invoke a component asynchronously with error handling.
+
+        Args:
+            component: The component to invoke (must support ainvoke)
+            inputs: The inputs to pass to the component
+            component_name: Name of the component for logging
+            default_response: Default response if the component fails
+
+        Returns:
+            The component's output or default response if an error occurs
+        """
+        try:
+            logger.debug("Invoking %s with inputs: %s", component_name, inputs)
+            result = await component.ainvoke(inputs)
+            logger.debug("%s returned: %s", component_name, result)
             return result
         except Exception as e:
-            logger.error(f"Error in {component_name}: {str(e)}")
-            logger.debug(f"Detailed traceback: {traceback.format_exc()}")
+            logger.error("Error in %s: %s", component_name, e)
+            logger.debug("Detailed traceback: %s", traceback.format_exc())
             return default_response
 
-    def search_memory(self, state: StateDict) -> StateDict:
+    def _invoke_concurrently(self, component: Any, inputs_list: List[Dict[str, Any]],
+                             component_name: str, default_response: Optional[Any] = None) -> List[Any]:
+        """Invoke a component once per input set, overlapping the calls.
+
+        Independent LLM calls (e.g. grading each retrieved document) are
+        network-bound, so running them concurrently with asyncio.gather
+        reduces wall time to roughly that of the slowest single call.
+        In-flight calls are capped at GRADER_MAX_CONCURRENCY.
+
+        Args:
+            component: The component to invoke (must support ainvoke)
+            inputs_list: One inputs dict per invocation
+            component_name: Name of the component for logging
+            default_response: Default response for invocations that fail
+
+        Returns:
+            List of outputs in the same order as inputs_list
+        """
+        async def _gather():
+            semaphore = asyncio.Semaphore(GRADER_MAX_CONCURRENCY)
+
+            async def _bounded(index, inputs):
+                async with semaphore:
+                    return await self._safe_ainvoke(
+                        component, inputs, f"{component_name} ({index})", default_response)
+
+            return await asyncio.gather(*[
+                _bounded(i, inputs) for i, inputs in enumerate(inputs_list)
+            ])
+
+        return asyncio.run(_gather())
+
+    def _grade_relevance(self, question: str, documents: List[Any],
+                         component_name: str) -> List[Dict[str, Any]]:
+        """Grade document relevance, batching into one LLM call when possible.
+
+        With a batch grader configured, all documents are scored in a
+        single Bedrock invocation; otherwise each document is graded
+        concurrently via the per-document grader.
+
+        Args:
+            question: The user's question
+            documents: Documents to grade
+            component_name: Name of the grading step for logging
+
+        Returns:
+            One {"score": "yes"|"no"} dict per document, in input order
+        """
+        # A yes/no relevance verdict rarely needs the full chunk; the
+        # leading slice keeps grader prompt tokens bounded
+        texts = [doc.page_content[:self.grader_context_chars] for doc in documents]
+
+        if self.batch_retrieval_grader and len(documents) > 1:
+            documents_json = json.dumps([
+                {"id": i, "text": text}
+                for i, text in enumerate(texts)
+            ])
+            result = self._safe_invoke(
+                self.batch_retrieval_grader,
+                {"question": question, "documents_json": documents_json},
+                f"{component_name} (batch)",
+                None
+            )
+            scores = result.get("scores") if isinstance(result, dict) else None
+            if isinstance(scores, list) and len(scores) == len(documents):
+                return [{"score": score} for score in scores]
+            logger.warning(f"Batch grading returned malformed scores, "
+                           f"falling back to per-document grading")
+
+        return self._invoke_concurrently(
+            self.retrieval_grader,
+            [{"question": question, "document": text} for text in texts],
+            component_name,
+            {"score": "no"}
+        )
+
+    @staticmethod
+    def _format_web_results(results) -> List[Dict[str, str]]:
+        """Format raw web search results with bounded concurrent fan-out.
+
+        Formatting itself is cheap today, but this is the natural hook
+        for per-result enrichment (fetching, summarizing), so it already
+        runs each result as a semaphore-bounded task; a failed result is
+        logged and dropped rather than failing the whole search.
+
+        Args:
+            results: Raw result dicts from the web search tool
+
+        Returns:
+            List of {"title", "url", "content"} dicts
+        """
+        async def _gather():
+            semaphore = asyncio.Semaphore(WEB_RESULT_CONCURRENCY)
+
+            async def _format(result):
+                async with semaphore:
+                    return {
+                        "title": result.get("title", ""),
+                        "url": result.get("url", ""),
+                        "content": result.get("content", "")
+                    }
+
+            return await asyncio.gather(*[_format(result) for result in results],
+                                        return_exceptions=True)
+
+        formatted_results = []
+        for item in asyncio.run(_gather()):
+            if isinstance(item, Exception):
+                logger.error("Error formatting search result: %s", item)
+            else:
+                formatted_results.append(item)
+        return formatted_results
+
+    @staticmethod
+    def _format_context(items) -> str:
+        """Build LLM context text from documents or web search results.
+
+        Joining page_content directly (instead of str() on the document
+        list) keeps repr noise and metadata out of the prompt, cutting
+        prompt tokens and LLM processing time.
+
+        Args:
+            items: Context as a string, Documents, or result dicts
+
+        Returns:
+            Newline-joined context text
+        """
+        if isinstance(items, str):
+            return items
+        parts = []
+        for item in items:
+            if isinstance(item, dict):
+                parts.append(f"Source: {item.get('url', '')}\n{item.get('content', '')}")
+            else:
+                parts.append(getattr(item, "page_content", str(item)))
+        return "\n\n".join(parts)
+
+    @_traced_node
+    def search_memory(self, state: StateDict, span, question) -> StateDict:
         """Search conversation memory for context.
         
         Args:
@@ -135,47 +487,41 @@ class WorkflowManager:
         Returns:
             Updated state with memory context
         """
-        tracer = trace.get_tracer("agentic-search-langgraph")
-        with tracer.start_as_current_span("search_memory") as span:
-            logger.info("Searching conversation memory")
-            question = state["question"]
-            span.set_attribute("question", question)
-            
-            # Add session context to span
-            session_ctx = get_session_context()
-            for key, value in session_ctx.items():
-                if value:
-                    span.set_attribute(f"session.{key}", value)
-            
-            memory_context = []
-            
-            if self.memory_client and self.memory_id:
-                try:
-                    events = self.memory_client.list_events(
-                        memory_id=self.memory_id,
-                        actor_id=self.actor_id,
-                        session_id=self.session_id,
-                        max_results=10
-                    )
-                    
-                    if events:
-                        # Format memory as documents for grading
-                        from langchain.schema import Document
-                        memory_context = [Document(page_content=str(events), metadata={"source": "memory"})]
-                        logger.info(f"Retrieved {len(events)} memory events")
-                    else:
-                        logger.info("No conversation history found")
-                        
-                except Exception as e:
-                    logger.warning(f"Failed to search memory: {str(e)}")
-            
-            return {
-                "question": question,
-                "documents": memory_context,
-                "web_search": "No"
-            }
+        logger.info("Searching conversation memory")
+        
+        memory_documents = []
+        memory_context = ""
+
+        if self.memory_client and self.memory_id:
+            try:
+                events = self._list_events_cached(max_results=10)
 
-    def retrieve(self, state: StateDict) -> StateDict:
+                if events:
+                    # Format memory as documents for grading
+                    from langchain.schema import Document
+                    memory_documents = [Document(
+                        page_content=_events_to_text(events, limit=len(events)),
+                        metadata={"source": "memory"})]
+                    # Formatted once here and carried through state so
+                    # generate does not re-fetch events
+                    memory_context = ("\n\nRecent conversation context:\n"
+                                      + _events_to_text(events))
+                    logger.info("Retrieved %d memory events", len(events))
+                else:
+                    logger.info("No conversation history found")
+
+            except Exception as e:
+                logger.warning("Failed to search memory: %s", e)
+
+        return {
+            "question": question,
+            "documents": memory_documents,
+            "web_search": "No",
+            "memory_context": memory_context
+        }
+
+    @_traced_node
+    def retrieve(self, state: StateDict, span, question) -> StateDict:
         """Retrieve documents based on question.
         
         Args:
@@ -184,34 +530,48 @@ class WorkflowManager:
         Returns:
             Updated state with retrieved documents
         """
-        tracer = trace.get_tracer("agentic-search-langgraph")
-        with tracer.start_as_current_span("retrieve") as span:
-            logger.info("Starting document retrieval")
-            question = state["question"]
-            span.set_attribute("question", question)
-            
-            # Add session context to span
-            session_ctx = get_session_context()
-            for key, value in session_ctx.items():
-                if value:
-                    span.set_attribute(f"session.{key}", value)
-            
-            try:
-                documents = self._safe_invoke(
-                    self.retriever, 
-                    question, 
-                    "retriever", 
-                    []
-                )
-                logger.info(f"Retrieved {len(documents)} documents")
+        logger.info("Starting document retrieval")
+
+        # Near-duplicate questions reuse the documents retrieved for
+        # an earlier question instead of hitting the vector store
+        question_embedding = None
+        if self._retrieval_cache is not None:
+            question_embedding = self._embed_question(question)
+            if question_embedding is not None:
+                cached_docs = self._retrieval_cache.lookup(question_embedding)
+                if cached_docs is not None:
+                    logger.info("Semantic cache served %d documents", len(cached_docs))
+                    if span.is_recording():
+                        span.set_attributes({
+                            "documents.count": len(cached_docs),
+                            "cache.hit": True
+                        })
+                    return {"documents": cached_docs, "question": question}
+
+        try:
+            documents = self._safe_invoke(
+                self.retriever,
+                question,
+                "retriever",
+                []
+            )
+            logger.info("Retrieved %d documents", len(documents))
+            # Deduplicate chunk texts against earlier retrievals and
+            # freeze the list before it enters state and the cache
+            documents = _intern_documents(documents)
+            if self._retrieval_cache is not None and question_embedding is not None and documents:
+                self._retrieval_cache.insert(question_embedding, documents)
+            if span.is_recording():
                 span.set_attribute("documents.count", len(documents))
-                return {"documents": documents, "question": question}
-            except Exception as e:
-                logger.error(f"Document retrieval failed: {str(e)}")
+            return {"documents": documents, "question": question}
+        except Exception as e:
+            logger.error("Document retrieval failed: %s", e)
+            if span.is_recording():
                 span.set_attribute("error", str(e))
-                return {"documents": [], "question": question}
+            return {"documents": [], "question": question}
 
-    def generate(self, state: StateDict) -> StateDict:
+    @_traced_node
+    def generate(self, state: StateDict, span, question) -> StateDict:
         """Generate answer based on documents and question.
         
         Args:
@@ -220,71 +580,51 @@ class WorkflowManager:
         Returns:
             Updated state with generated answer
         """
-        tracer = trace.get_tracer("agentic-search-langgraph")
-        with tracer.start_as_current_span("generate") as span:
-            logger.info("Starting answer generation")
-            question = state["question"]
-            documents = state["documents"]
-            span.set_attribute("question", question)
-            
-            # Add session context to span
-            session_ctx = get_session_context()
-            for key, value in session_ctx.items():
-                if value:
-                    span.set_attribute(f"session.{key}", value)
-            
-            # Get memory context if available
-            memory_context = ""
-            if self.memory_client and self.memory_id:
-                try:
-                    events = self.memory_client.list_events(
-                        memory_id=self.memory_id,
-                        actor_id=self.actor_id,
-                        session_id=self.session_id,
-                        max_results=5
-                    )
-                    if events:
-                        memory_context = "\n\nRecent conversation context:\n" + str(events)
-                except Exception as e:
-                    logger.warning(f"Failed to retrieve memory context: {str(e)}")
+        logger.info("Starting answer generation")
+        documents = state["documents"]
+
+        # Memory context was fetched and formatted once in search_memory
+        memory_context = state.get("memory_context", "")
+
+        try:
+            # Include memory context in the generation
+            context_with_memory = self._format_context(documents) + memory_context
+            generation = self._safe_invoke(
+                self.rag_chain, 
+                {"context": context_with_memory, "question": question}, 
+                "rag_chain",
+                "I don't have enough information to answer this question."
+            )
+            logger.info("Generated answer length: %d characters", len(generation))
+            if span.is_recording():
+                span.set_attribute("generation.length", len(generation))
             
-            try:
-                # Include memory context in the generation
-                context_with_memory = str(documents) + memory_context
-                generation = self._safe_invoke(
-                    self.rag_chain, 
-                    {"context": context_with_memory, "question": question}, 
-                    "rag_chain",
-                    "I don't have enough information to answer this question."
+            # Save conversation to memory off the response path; the
+            # user never reads this round-trip, so don't wait on it
+            if self.memory_client and self.memory_id and generation.strip():
+                conversation = [
+                    (question, "USER"),
+                    (generation, "ASSISTANT")
+                ]
+                future = _MEMORY_WRITER.submit(
+                    self.memory_client.create_event,
+                    memory_id=self.memory_id,
+                    actor_id=self.actor_id,
+                    session_id=self.session_id,
+                    messages=conversation
                 )
-                logger.info(f"Generated answer length: {len(generation)} characters")
-                span.set_attribute("generation.length", len(generation))
-                
-                # Save conversation to memory
-                if self.memory_client and self.memory_id and generation.strip():
-                    try:
-                        conversation = [
-                            (question, "USER"),
-                            (generation, "ASSISTANT")
-                        ]
-                        self.memory_client.create_event(
-                            memory_id=self.memory_id,
-                            actor_id=self.actor_id,
-                            session_id=self.session_id,
-                            messages=conversation
-                        )
-                        logger.info("Conversation saved to memory")
-                    except Exception as e:
-                        logger.warning(f"Failed to save conversation to memory: {str(e)}")
-                
-                return {"documents": documents, "question": question, "generation": generation}
-            except Exception as e:
-                logger.error(f"Answer generation failed: {str(e)}")
+                future.add_done_callback(self._log_memory_write)
+            
+            return {"documents": documents, "question": question, "generation": generation}
+        except Exception as e:
+            logger.error("Answer generation failed: %s", e)
+            if span.is_recording():
                 span.set_attribute("error", str(e))
-                fallback_response = "I'm sorry, I encountered an error while generating an answer."
-                return {"documents": documents, "question": question, "generation": fallback_response}
+            fallback_response = "I'm sorry, I encountered an error while generating an answer."
+            return {"documents": documents, "question": question, "generation": fallback_response}
 
-    def grade_documents(self, state: StateDict) -> StateDict:
+    @_traced_node
+    def grade_documents(self, state: StateDict, span, question) -> StateDict:
         """Grade document relevance to the question.
         
         Args:
@@ -293,53 +633,63 @@ class WorkflowManager:
         Returns:
             Updated state with filtered documents and web search flag
         """
-        tracer = trace.get_tracer("agentic-search-langgraph")
-        with tracer.start_as_current_span("grade_documents") as span:
-            logger.info("Grading document relevance")
-            question = state["question"]
-            documents = state.get("documents", [])
-            span.set_attribute("question", question)
+        logger.info("Grading document relevance")
+        documents = state.get("documents", [])
+        if span.is_recording():
             span.set_attribute("documents.input_count", len(documents))
-            
-            if not documents:
-                logger.warning("No documents to grade, defaulting to web search")
+        
+        if not documents:
+            logger.warning("No documents to grade, defaulting to web search")
+            if span.is_recording():
                 span.set_attribute("web_search_needed", True)
-                return {"documents": [], "question": question, "web_search": "Yes"}
-            
-            filtered_docs = []
-            
-            for i, doc in enumerate(documents):
+            return {"documents": [], "question": question, "web_search": "Yes"}
+        
+        filtered_docs = []
+
+        # Grade in retriever order, min_relevant_docs at a time (each
+        # slice is one batched LLM call when possible), and stop as
+        # soon as enough relevant documents are in hand — grading the
+        # rest would be wasted LLM spend
+        for start in range(0, len(documents), self.min_relevant_docs):
+            batch = documents[start:start + self.min_relevant_docs]
+            scores = self._grade_relevance(question, batch, "retrieval_grader")
+
+            for i, (doc, score) in enumerate(zip(batch, scores), start=start):
                 try:
-                    score = self._safe_invoke(
-                        self.retrieval_grader,
-                        {"question": question, "document": doc.page_content},
-                        f"retrieval_grader (doc {i})",
-                        {"score": "no"}
-                    )
-                    
                     grade = score.get('score', '').lower()
-                    
+
                     if grade == "yes":
-                        logger.info(f"Document {i} is relevant")
+                        logger.info("Document %s is relevant", i)
                         filtered_docs.append(doc)
                     else:
-                        logger.info(f"Document {i} is not relevant")
+                        logger.info("Document %s is not relevant", i)
                 except Exception as e:
-                    logger.error(f"Error grading document {i}: {str(e)}")
-            
-            # Only use web search if NO relevant documents found
-            if filtered_docs:
-                web_search = "No"
-                logger.info(f"Found {len(filtered_docs)} relevant documents, proceeding to generate")
-            else:
-                web_search = "Yes"
-                logger.warning("No relevant documents found, will use web search")
-            
-            span.set_attribute("documents.filtered_count", len(filtered_docs))
-            span.set_attribute("web_search_needed", web_search == "Yes")
-            return {"documents": filtered_docs, "question": question, "web_search": web_search}
+                    logger.error("Error grading document %s: %s", i, e)
+
+            if len(filtered_docs) >= self.min_relevant_docs:
+                remaining = len(documents) - start - len(batch)
+                if remaining > 0:
+                    logger.info("Enough relevant documents found, skipping "
+                                "%d ungraded documents", remaining)
+                break
+
+        # Only use web search if NO relevant documents found
+        if filtered_docs:
+            web_search = "No"
+            logger.info("Found %d relevant documents, proceeding to generate", len(filtered_docs))
+        else:
+            web_search = "Yes"
+            logger.warning("No relevant documents found, will use web search")
+        
+        if span.is_recording():
+            span.set_attributes({
+                "documents.filtered_count": len(filtered_docs),
+                "web_search_needed": web_search == "Yes"
+            })
+        return {"documents": filtered_docs, "question": question, "web_search": web_search}
 
-    def web_search(self, state: StateDict) -> StateDict:
+    @_traced_node
+    def web_search(self, state: StateDict, span, question) -> StateDict:
         """Perform web search for additional information.
         
         Args:
@@ -348,48 +698,33 @@ class WorkflowManager:
         Returns:
             Updated state with web search results
         """
-        tracer = trace.get_tracer("agentic-search-langgraph")
-        with tracer.start_as_current_span("web_search") as span:
-            logger.info("Performing web search")
-            question = state["question"]
-            span.set_attribute("question", question)
-            try:
-                docs = self._safe_invoke(
-                    self.web_search_tool,
-                    {"query": question},
-                    "web_search_tool",
-                    []
-                )
-                
-                formatted_results = []
-                for result in docs:
-                    try:
-                        formatted_results.append({
-                            "title": result.get("title", ""),
-                        "url": result.get("url", ""),
-                        "content": result.get("content", "")
-                    })
-                    except Exception as e:
-                        logger.error(f"Error formatting search result: {str(e)}")
-            except Exception as e:
-                logger.error(f"Web search failed: {str(e)}")
-                return {"documents": "Web search failed to return results.", "question": question}
-            
-            # Create context from results
-            if formatted_results:
-                context = "\n\n".join([
-                    f"Source: {result['url']}\n{result['content']}"
-                    for result in formatted_results
-                ])
-                logger.info(f"Web search returned {len(formatted_results)} results")
-            else:
-                context = "No relevant information found from web search."
-                logger.warning("Web search returned no results")
+        logger.info("Performing web search")
+        try:
+            docs = self._safe_invoke(
+                self.web_search_tool,
+                {"query": question},
+                "web_search_tool",
+                []
+            )
             
-            return {"documents": context, "question": question}
+            formatted_results = self._format_web_results(docs)
+        except Exception as e:
+            logger.error("Web search failed: %s", e)
+            return {"documents": "Web search failed to return results.", "question": question}
+        
+        # Create context from results
+        if formatted_results:
+            context = self._format_context(formatted_results)
+            logger.info("Web search returned %d results", len(formatted_results))
+        else:
+            context = "No relevant information found from web search."
+            logger.warning("Web search returned no results")
         
+        return {"documents": context, "question": question}
 
-    def grade_memory(self, state: StateDict) -> StateDict:
+
+    @_traced_node
+    def grade_memory(self, state: StateDict, span, question) -> StateDict:
         """Grade memory context relevance to the question.
         
         Args:
@@ -398,51 +733,56 @@ class WorkflowManager:
         Returns:
             Updated state with filtered memory and web search flag
         """
-        tracer = trace.get_tracer("agentic-search-langgraph")
-        with tracer.start_as_current_span("grade_memory") as span:
-            logger.info("Grading memory context relevance")
-            question = state["question"]
-            documents = state.get("documents", [])
-            span.set_attribute("question", question)
+        logger.info("Grading memory context relevance")
+        documents = state.get("documents", [])
+        if span.is_recording():
             span.set_attribute("documents.input_count", len(documents))
-            
-            if not documents:
-                logger.info("No memory context to grade, proceeding to vector search")
-                return {"documents": [], "question": question, "web_search": "Yes"}
-            
-            filtered_docs = []
-            
-            for i, doc in enumerate(documents):
-                try:
-                    score = self._safe_invoke(
-                        self.retrieval_grader,
-                        {"question": question, "document": doc.page_content},
-                        f"memory_grader (doc {i})",
-                        {"score": "no"}
-                    )
-                    
-                    grade = score.get('score', '').lower()
-                    
-                    if grade == "yes":
-                        logger.info(f"Memory context {i} is relevant")
-                        filtered_docs.append(doc)
-                    else:
-                        logger.info(f"Memory context {i} is not relevant")
-                except Exception as e:
-                    logger.error(f"Error grading memory context {i}: {str(e)}")
-            
-            # Only proceed to vector search if NO relevant memory found
-            if filtered_docs:
-                web_search = "No"
-                logger.info(f"Found {len(filtered_docs)} relevant memory contexts, proceeding to generate")
-            else:
-                web_search = "Yes"
-                logger.info("No relevant memory context found, will use vector search")
-            
-            span.set_attribute("documents.filtered_count", len(filtered_docs))
-            span.set_attribute("vector_search_needed", web_search == "Yes")
-            return {"documents": filtered_docs, "question": question, "web_search": web_search}
-    
+        
+        if not documents:
+            logger.info("No memory context to grade, proceeding to vector search")
+            return {"documents": [], "question": question, "web_search": "Yes"}
+
+        # A near-empty memory blob (the common case early in a session)
+        # is not worth a grader LLM call
+        if (len(documents) == 1
+                and len(documents[0].page_content) < self.memory_grader_min_chars):
+            logger.info("Memory context below grading threshold, skipping grader")
+            if self.memory_default_relevant:
+                return {"documents": documents, "question": question, "web_search": "No"}
+            return {"documents": [], "question": question, "web_search": "Yes"}
+
+        filtered_docs = []
+
+        # Grade all memory contexts in one batched call, mirroring grade_documents
+        scores = self._grade_relevance(question, documents, "memory_grader")
+
+        for i, (doc, score) in enumerate(zip(documents, scores)):
+            try:
+                grade = score.get('score', '').lower()
+
+                if grade == "yes":
+                    logger.info("Memory context %s is relevant", i)
+                    filtered_docs.append(doc)
+                else:
+                    logger.info("Memory context %s is not relevant", i)
+            except Exception as e:
+                logger.error("Error grading memory context %s: %s", i, e)
+        
+        # Only proceed to vector search if NO relevant memory found
+        if filtered_docs:
+            web_search = "No"
+            logger.info("Found %d relevant memory contexts, proceeding to generate", len(filtered_docs))
+        else:
+            web_search = "Yes"
+            logger.info("No relevant memory context found, will use vector search")
+        
+        if span.is_recording():
+            span.set_attributes({
+                "documents.filtered_count": len(filtered_docs),
+                "vector_search_needed": web_search == "Yes"
+            })
+        return {"documents": filtered_docs, "question": question, "web_search": web_search}
+
     def decide_after_memory(self, state: StateDict) -> str:
         """Decide next step after memory grading.
         
@@ -496,10 +836,40 @@ class WorkflowManager:
         generation = state["generation"]
         
         # Check if this is a fallback response - if so, accept it
-        if "I don't have enough information" in generation:
+        if _FALLBACK_RE.search(generation):
             logger.info("Fallback response detected, accepting as useful")
             return "useful"
-        
+
+        # Fused grading path: grounding and usefulness in one LLM call
+        if self.combined_grader:
+            try:
+                score = self._safe_invoke(
+                    self.combined_grader,
+                    {"question": question, "documents": documents, "generation": generation},
+                    "combined_grader",
+                    {"grounded": "yes", "useful": "yes"}  # Default to accepting
+                )
+                if not isinstance(score, dict):
+                    raise ValueError(f"combined grader returned {type(score).__name__}, expected dict")
+
+                # str() tolerates off-schema values such as JSON booleans
+                # ({"grounded": true}) in place of "yes"/"no"
+                grounded = str(score.get('grounded', 'yes')).lower()
+                useful = str(score.get('useful', 'yes')).lower()
+
+                if grounded in ("no", "false"):
+                    logger.info("Answer is not grounded in the documents")
+                    return "not supported"
+                if useful in ("no", "false"):
+                    logger.info("Answer is not useful for the question")
+                    return "not useful"
+                logger.info("Answer is useful for the question")
+                return "useful"
+            except Exception as e:
+                logger.error("Error in combined grading: %s", e)
+                # Default to useful to avoid infinite loops
+                return "useful"
+
         # Check usefulness first (more lenient than hallucination check)
         try:
             score = self._safe_invoke(
@@ -518,18 +888,33 @@ class WorkflowManager:
                 logger.info("Answer is not useful for the question")
                 return "not useful"
         except Exception as e:
-            logger.error(f"Error grading answer: {str(e)}")
+            logger.error("Error grading answer: %s", e)
             # Default to useful to avoid infinite loops
             return "useful"
 
     def create_workflow(self) -> Callable:
         """Create and configure the workflow graph.
-        
+
+        The compiled graph is built once and reused across requests; all
+        per-session values (memory_id, session_id, graders) live on self,
+        so the graph itself is stateless and safe to share.
+
         Returns:
             Compiled workflow graph ready for execution
         """
+        if self._compiled_workflow is not None:
+            return self._compiled_workflow
+
+        with self._compile_lock:
+            if self._compiled_workflow is not None:
+                return self._compiled_workflow
+            self._compiled_workflow = self._build_workflow()
+            return self._compiled_workflow
+
+    def _build_workflow(self) -> Callable:
+        """Construct and compile the state graph."""
         logger.info("Creating workflow graph")
-        
+
         try:
             workflow = StateGraph(GraphState)
             
@@ -577,8 +962,8 @@ class WorkflowManager:
             logger.info("Workflow graph created successfully")
             return workflow.compile()
         except Exception as e:
-            logger.error(f"Error creating workflow: {str(e)}")
-            logger.debug(f"Detailed traceback: {traceback.format_exc()}")
+            logger.error("Error creating workflow: %s", e)
+            logger.debug("Detailed traceback: %s", traceback.format_exc())
             raise RuntimeError(f"Failed to create workflow: {str(e)}") from e
             
     def update_vectorstore(self, doc_splits):
@@ -595,12 +980,14 @@ class WorkflowManager:
             return False
             
         try:
-            logger.info(f"Adding {len(doc_splits)} document chunks to vector store")
-            self.vectorstore.add_documents(doc_splits)
-            self.vectorstore.persist()
-            logger.info("Documents added and vector store persisted")
+            # Shares the ingestion path's batched embedding and debounced
+            # persist instead of forcing a full fsync per call
+            from document_processor import add_documents_to_vectorstore
+
+            logger.info("Adding %d document chunks to vector store", len(doc_splits))
+            add_documents_to_vectorstore(self.vectorstore, doc_splits)
             return True
         except Exception as e:
-            logger.error(f"Error updating vector store: {str(e)}")
-            logger.debug(f"Detailed traceback: {traceback.format_exc()}")
+            logger.error("Error updating vector store: %s", e)
+            logger.debug("Detailed traceback: %s", traceback.format_exc())
             return False
\ No newline at end of file